@@ -0,0 +1,184 @@
+""" Persistent on-disk cache with size limit and LRU eviction """
+import os
+import time
+import zlib
+import sqlite3
+import threading
+import cPickle as pickle
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+from appdirs import user_data_dir
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """ returns SHA-256 hex digest of file content """
+    digest = sha256()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(chunk_size), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileCache(object):
+    """ Stores values as compressed pickles, one file per key, in
+    user_data_dir('slidelint')/cache/<name>. Entries access time is tracked
+    by files modification time, so when cache grows over size_limit the least
+    recently used entries are removed first."""
+    suffix = '.bin'
+
+    def __init__(self, name, size_limit=64 * 1024 * 1024):
+        self.path = os.path.join(user_data_dir('slidelint'), 'cache', name)
+        self.size_limit = size_limit
+
+    def _entry_path(self, key):
+        """ returns path to file of cache entry """
+        return os.path.join(self.path, key + self.suffix)
+
+    def __contains__(self, key):
+        """ checks whether there is entry of key without loading it """
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key):
+        """ returns cached value or None if there is no such entry """
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as entry_file:
+                value = pickle.loads(zlib.decompress(entry_file.read()))
+            os.utime(entry, None)
+        # broken or concurrently evicted entry is the same as missing one
+        except Exception:  # pylint: disable=W0703
+            return None
+        return value
+
+    def set(self, key, value):
+        """ stores value in cache and evicts old entries if it's needed """
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            # writing to temporary file and renaming it makes entry appearing
+            # atomic for concurrently running slidelint processes
+            with NamedTemporaryFile(dir=self.path, delete=False) as entry:
+                entry.write(data)
+            os.rename(entry.name, self._entry_path(key))
+            self.evict()
+        except (IOError, OSError), msg:
+            # caching is optional, so linting must go on without it
+            LOGGER.debug("can't write to cache '%s': %s", self.path, msg)
+
+    def evict(self):
+        """ removes least recently used entries while cache is too big """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total_size = sum(i[1] for i in entries)
+        while entries and total_size > self.size_limit:
+            _, size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                LOGGER.debug("cache entry '%s' was already removed", name)
+            total_size -= size
+
+
+class SqliteCache(object):
+    """ Stores values as pickles in SQLite database
+    user_data_dir('slidelint')/cache/<name>.sqlite, so many small entries can
+    be read or written by one transaction. Entries access time is tracked,
+    when values grow over size_limit bytes the least recently used entries
+    are removed first."""
+
+    def __init__(self, name, size_limit=32 * 1024 * 1024):
+        self.path = os.path.join(user_data_dir('slidelint'), 'cache',
+                                 name + '.sqlite')
+        self.size_limit = size_limit
+        # sqlite connection can be used only by thread that created it
+        self.local = threading.local()
+
+    def connect(self):
+        """ returns connection to database, connections aren't shared with
+        other threads or forked processes """
+        local = self.local
+        if getattr(local, 'connection', None) is None or \
+                local.key != (os.getpid(), self.path):
+            cache_dir = os.path.dirname(self.path)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            connection = sqlite3.connect(self.path, timeout=30)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY,"
+                    " value BLOB, size INTEGER, used REAL)")
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS entries_used ON entries(used)")
+            local.connection = connection
+            local.key = (os.getpid(), self.path)
+        return local.connection
+
+    def get_many(self, keys):
+        """ returns dict of cached values of keys, missing keys are omitted """
+        values = {}
+        try:
+            connection = self.connect()
+            with connection:
+                for key in keys:
+                    row = connection.execute(
+                        "SELECT value FROM entries WHERE key = ?",
+                        (key,)).fetchone()
+                    if row is not None:
+                        values[key] = pickle.loads(str(row[0]))
+                now = time.time()
+                connection.executemany(
+                    "UPDATE entries SET used = ? WHERE key = ?",
+                    [(now, key) for key in values])
+        # broken cache is the same as empty one
+        except (sqlite3.Error, OSError, pickle.UnpicklingError), msg:
+            LOGGER.debug("can't read from cache '%s': %s", self.path, msg)
+            return {}
+        return values
+
+    def set_many(self, items):
+        """ stores (key, value) pairs in cache and evicts old entries if
+        it's needed """
+        now = time.time()
+        rows = []
+        for key, value in items:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, sqlite3.Binary(data), len(data), now))
+        if not rows:
+            return
+        try:
+            connection = self.connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    rows)
+                self.evict(connection)
+        except (sqlite3.Error, OSError), msg:
+            # caching is optional, so linting must go on without it
+            LOGGER.debug("can't write to cache '%s': %s", self.path, msg)
+
+    def evict(self, connection):
+        """ removes least recently used entries while cache is too big """
+        total_size = connection.execute(
+            "SELECT SUM(size) FROM entries").fetchone()[0] or 0
+        if total_size <= self.size_limit:
+            return
+        evicted = []
+        for key, size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY used"):
+            if total_size <= self.size_limit:
+                break
+            evicted.append((key,))
+            total_size -= size
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
@@ -1,7 +1,7 @@
 """ No text found checker """
 
 from slidelint.utils import help_wrapper
-from slidelint.pdf_utils import convert_pdf_to_text
+from slidelint.pdf_utils import iter_pages_text
 
 MESSAGES = (
     dict(id='W1001',
@@ -11,12 +11,15 @@ MESSAGES = (
 
 
 @help_wrapper(MESSAGES)
-def main(target_file=None, ):
-    """ No text found checker """
-    for page in convert_pdf_to_text(target_file):
-        for paragraph in page:
-            if paragraph:
-                return []
+def main(target_file=None, pages_text=None):
+    """ No text found checker, it stops on the first page with text;
+    pages_text is list of paragraphs per page that are given while the
+    document is parsed(see cli.parse_document) """
+    if pages_text is None:
+        pages_text = iter_pages_text(target_file)
+    for page in pages_text:
+        if any(page):
+            return []
     return [dict(id='W1001',
                  msg_name='no-text-found',
                  msg='No text found',
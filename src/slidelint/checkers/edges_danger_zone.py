@@ -1,6 +1,6 @@
 """ Checker for determining text in danger zones around edges """
 from slidelint.utils import help_wrapper
-from slidelint.pdf_utils import document_pages_layouts, layout_characters
+from slidelint.pdf_utils import document_pages_layouts
 
 MESSAGES = (
     dict(id='C1003',
@@ -35,23 +35,24 @@ def check_edges_danger_zone(path, min_page_ratio=12):
             page_layout.width - width_dist,
             page_layout.height - height_dist)
         # checking save zone
-        for character in layout_characters(page_layout):
-            legal = (
-                save_zone[0] < character.bbox[0],
-                save_zone[1] < character.bbox[1],
-                save_zone[2] > character.bbox[2],
-                save_zone[3] > character.bbox[3])
-            if not all(legal):
-                rez.append({
-                    'id': 'C1003',
-                    'page': 'Slide %s' % (page_num + 1),
-                    'msg_name': 'too-close-to-edges',
-                    'msg': 'Too close to edges: Text should not appear '
-                           'closer than 1/%sth of the page size '
-                           'to the edges.' % min_page_ratio,
-                    'help': 'Too close to edges: Text should not appear '
-                    'closer than 1/12th(by default) of the'
-                    ' page size to the edges.'}
-                )
-                break
+        characters = page_layout.characters
+        if not characters:
+            continue
+        legal = (
+            save_zone[0] < min(characters.x0),
+            save_zone[1] < min(characters.y0),
+            save_zone[2] > max(characters.x1),
+            save_zone[3] > max(characters.y1))
+        if not all(legal):
+            rez.append({
+                'id': 'C1003',
+                'page': 'Slide %s' % (page_num + 1),
+                'msg_name': 'too-close-to-edges',
+                'msg': 'Too close to edges: Text should not appear '
+                       'closer than 1/%sth of the page size '
+                       'to the edges.' % min_page_ratio,
+                'help': 'Too close to edges: Text should not appear '
+                'closer than 1/12th(by default) of the'
+                ' page size to the edges.'}
+            )
     return rez
@@ -1,6 +1,6 @@
 """ Font size checker """
 from slidelint.utils import help_wrapper
-from slidelint.pdf_utils import document_pages_layouts, layout_characters
+from slidelint.pdf_utils import document_pages_layouts
 
 MESSAGES = (
     dict(id='C1002',
@@ -26,16 +26,15 @@ def check_text_size(path, min_page_ratio='6'):
     for page_num, page_layout in document_pages_layouts(path):
         # comparing only heights of page and text
         page_size = page_layout.height
-        for character in layout_characters(page_layout):
-            if character.size * min_page_ratio < page_size:
-                rez.append(
-                    {'id': 'C1002',
-                     'page': 'Slide %s' % (page_num + 1),
-                     'msg_name': 'font-to-small',
-                     'msg': "Font is to small: Text should take up "
-                            "a minimum of 1/%sth the page." % min_page_ratio,
-                     'help': "Font is to small: Text should take up "
-                             "a minimum of 1/6th(by default) the page."}
-                )
-                break
+        characters = page_layout.characters
+        if characters and min(characters.size) * min_page_ratio < page_size:
+            rez.append(
+                {'id': 'C1002',
+                 'page': 'Slide %s' % (page_num + 1),
+                 'msg_name': 'font-to-small',
+                 'msg': "Font is to small: Text should take up "
+                        "a minimum of 1/%sth the page." % min_page_ratio,
+                 'help': "Font is to small: Text should take up "
+                         "a minimum of 1/6th(by default) the page."}
+            )
     return rez
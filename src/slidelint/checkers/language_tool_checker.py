@@ -1,12 +1,24 @@
 """ Language tool based grammar checker """
 from slidelint.utils import help_wrapper
-from slidelint.pdf_utils import convert_pdf_to_text
+from slidelint.pdf_utils import stream_pages_text
+from slidelint.cache import SqliteCache
+from slidelint.checkers.language_tool_rules import RULES, RulesChecker
+from slidelint.checkers.language_tool_server import LANGUAGE, \
+    CHECK_ERRORS, LanguagetoolServersPool, start_servers_pool, \
+    close_servers_pool, get_languagetool_port_and_pid, registry_file, \
+    server_settings, languagetool_version
 import os
-import subprocess
-from lxml import etree
-import socket
-from appdirs import user_data_dir
-import requests
+import sys
+import threading
+import Queue
+from hashlib import sha256
+from functools import partial
+from bisect import bisect_right
+from itertools import chain, imap, izip
+from multiprocessing.pool import ThreadPool
+
+import logging
+LOGGER = logging.getLogger(__name__)
 
 PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LT_PATH = os.path.join(PACKAGE_ROOT, 'LanguageTool')
@@ -524,99 +536,18 @@ MESSAGES = (
 
 MESSAGES_BY_RULES = {m['msg_name']: m for m in MESSAGES}
 
-
-def get_free_port():
-    """ returns unused port number"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
-    sock.bind(('', 0))
-    sock.listen(socket.SOMAXCONN)
-    _, port = sock.getsockname()
-    sock.close()
-    return str(port)
-
-
-def start_languagetool_server(lt_path, config_file):
-    """ starts languagetool_server, returns its port and pid """
-    port = get_free_port()
-    cmd = ['java', '-cp', os.path.join(lt_path, 'languagetool-server.jar'),
-           'org.languagetool.server.HTTPServer', '--port', port]
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,)
-    pid = process.pid
-    with open(config_file, 'w') as out_file:
-        out_file.write("%s,%s" % (port, pid))
-    # waiting for server start
-    output = []
-    while True:
-        output.append(process.stdout.readline())
-        if 'Server started' in output[-1]:
-            break
-
-        retcode = process.poll()
-        if retcode is not None:
-            output.extend(process.stdout.readlines())
-            output.insert(
-                0,
-                "languagetool-server died with exit code %s!\n" % retcode
-            )
-            output.insert(1, " ".join(cmd) + "\n")
-            output.append("\nLanguageTool requires Java 7 or later."
-                          " Please check and update java version."
-                          " For more details look at "
-                          "http://help.ubuntu.com/community/Java\n")
-            raise IOError("".join(output))
-    return port, pid
-
-
-def get_languagetool_port_and_pid(lt_path, config_file):
-    """ checks if languagetool is running and stats it if not;
-    returns its ports and pid"""
-    if os.path.isfile(config_file):
-        port, pid = open(config_file, 'r').read().strip(' \n').split(',')
-        if os.path.exists("/proc/%s" % pid):
-            return port, int(pid)
-    return start_languagetool_server(lt_path, config_file)
-
-
-class LanguagetoolServer(object):
-    """ Class for allowing to work with LanguagetoolServer as
-    with context object"""
-    def __init__(self, lt_path, keep_alive=False):
-        self.keep_alive = keep_alive
-        config_dir = user_data_dir('slidelint')
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
-        self.config_file = os.path.join(config_dir, 'run')
-        self.lt_path = lt_path
-        self.port, self.pid = get_languagetool_port_and_pid(self.lt_path,
-                                                            self.config_file)
-        self.url = 'http://127.0.0.1:%s' % self.port
-
-    def grammar_checker(self, text, language="en-US"):
-        """ sends text to Languagetool Server and returns its checks results"""
-        data = dict(language=language, text=text)
-        try:
-            content = requests.post(self.url, data=data, timeout=15)
-        except requests.exceptions.Timeout:
-            # after tense LanguagetoolServer are freezing,
-            # so it's needs a restart
-            os.kill(self.pid, 9)
-            self.port, self.pid = start_languagetool_server(self.lt_path,
-                                                            self.config_file)
-            self.url = 'http://127.0.0.1:%s' % self.port
-            content = requests.post(self.url, data=data, timeout=15)
-        root = etree.fromstring(content.text.encode('utf-8'))
-        return root.findall('error')
-
-    def __enter__(self):
-        return self.grammar_checker
-
-    def __exit__(self, exc_type, exc_value, exc_traceback):
-        if not self.keep_alive:
-            os.kill(self.pid, 9)
+# paragraphs of one request are separated as paragraphs for LanguageTool too
+PARAGRAPHS_SEPARATOR = '\n\n'
+# number of characters around an error in its context, as LanguageTool has
+CONTEXT_SIZE = 40
+# paragraphs checks results per Language Tool version, language and text
+GRAMMAR_CACHE = SqliteCache('grammar')
+# longer texts are checked by parts, failed texts are split in halves down
+# to MIN_CHUNK_SIZE characters
+CHUNK_SIZE = 10000
+MIN_CHUNK_SIZE = 200
+# number of pages that are extracted from document in advance of checks
+PAGES_AHEAD = 8
 
 
 def new_lines_replaser(string):
@@ -625,26 +556,404 @@ def new_lines_replaser(string):
     return string.replace('\n', ' ').replace('  ', ' ')
 
 
+def pages_paragraphs(pages, start=0):
+    """ yields (page number, paragraph) pairs of pages, which numbers
+    begin with start, paragraphs are cleaned up for languagetool """
+    for num, page in enumerate(pages, start):
+        for paragraph in page:
+            # fixing new-lines and spaces for languagetool
+            yield num, new_lines_replaser(paragraph)
+
+
+def pages_in_background(pages, size=PAGES_AHEAD):
+    """ yields pages that are iterated by background thread through queue of
+    size pages, so pages extraction(e.g. PDF parsing) goes on while the
+    previous pages are checked; extraction error is raised by consumer """
+    queue = Queue.Queue(size)
+    stopped = threading.Event()
+
+    def put(item):
+        """ puts item to queue, returns False if consumer is gone """
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def extract():
+        """ puts pages to queue until they are over """
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+        # error is passed to consumer as is
+        except Exception:  # pylint: disable=W0703
+            put((None, sys.exc_info()))
+            return
+        put((None, None))
+    # extraction starts with the first page request, so pages that are
+    # never requested aren't extracted at all
+    extractor = threading.Thread(target=extract)
+    extractor.daemon = True
+    extractor.start()
+    try:
+        while True:
+            page, error = queue.get()
+            if error is not None:
+                raise error[0], error[1], error[2]
+            if page is None:
+                return
+            yield page
+    finally:
+        stopped.set()
+
+
+def unique_paragraphs(paragraphs):
+    """ returns (page number, paragraph) pairs with first occurrence of
+    each paragraph text only - repeated footers, notices and titles are
+    checked once and theirs errors are reported for every slide """
+    seen = set()
+    unique = []
+    for num, text in paragraphs:
+        if text not in seen:
+            seen.add(text)
+            unique.append((num, text))
+    return unique
+
+
+def paragraphs_batches(paragraphs, size_limit, per_page=False):
+    """ groups (page number, paragraph) pairs into batches that are checked
+    by one request; batch size is limited by size_limit characters(paragraph
+    that is bigger than the limit makes a batch by itself), if per_page is
+    True batches don't cross pages bounds """
+    batch, size = [], 0
+    for num, text in paragraphs:
+        if batch and (size + len(text) > size_limit or
+                      (per_page and batch[-1][0] != num)):
+            yield batch
+            batch, size = [], 0
+        batch.append((num, text))
+        size += len(text) + len(PARAGRAPHS_SEPARATOR)
+    if batch:
+        yield batch
+
+
+def error_offset(error, text):
+    """ returns offset of error in checked text, it's taken from 'offset'
+    attribute or calculated from 'fromy' and 'fromx' ones """
+    if error.get('offset') is not None:
+        return int(error.get('offset'))
+    lines = text.split('\n')[:int(error.get('fromy'))]
+    return sum(len(line) + 1 for line in lines) + int(error.get('fromx'))
+
+
+def error_context(text, offset, length, size=CONTEXT_SIZE):
+    """ returns error context in text as LanguageTool makes it """
+    first = max(offset - size, 0)
+    last = min(offset + length + size, len(text))
+    context = text[first:last].replace('\n', ' ')
+    return ('...' if first > 0 else '') + context + \
+        ('...' if last < len(text) else '')
+
+
+def split_text(text, size):
+    """ returns list of (offset, chunk) of text split into chunks not longer
+    than size; text is split at paragraphs, sentences or words ends if it's
+    possible """
+    chunks = []
+    start = 0
+    while len(text) - start > size:
+        end = start + size
+        for marks in ((PARAGRAPHS_SEPARATOR,), ('. ', '? ', '! '), (' ',)):
+            cut = max(text.rfind(mark, start, end) for mark in marks)
+            if cut > start:
+                cut += len(marks[0])
+                break
+        else:
+            cut = end
+        chunks.append((start, text[start:cut]))
+        start = cut
+    chunks.append((start, text[start:]))
+    return chunks
+
+
+def check_text(grammar_checker, text, chunk_size=CHUNK_SIZE):
+    """ returns list of (offset, error) of text; text longer than chunk_size
+    is checked by parts, as well as text which check failed - it's split in
+    halves down to MIN_CHUNK_SIZE, so one pathological text doesn't stall
+    the others """
+    if len(text) <= chunk_size:
+        try:
+            return [(error_offset(error, text), error)
+                    for error in grammar_checker(text)]
+        except CHECK_ERRORS:
+            if len(text) <= MIN_CHUNK_SIZE:
+                raise
+            chunk_size = max(MIN_CHUNK_SIZE, len(text) // 2)
+    errors = []
+    for offset, chunk in split_text(text, chunk_size):
+        errors.extend((offset + position, error) for position, error
+                      in check_text(grammar_checker, chunk, chunk_size))
+    return errors
+
+
+def check_batch(grammar_checker, batch):
+    """ checks batch of paragraphs by one request(see check_text) and maps
+    found errors back to theirs paragraphs; returns list of (error
+    attributes, context) lists per paragraph of batch """
+    text = PARAGRAPHS_SEPARATOR.join(paragraph for _, paragraph in batch)
+    starts = []
+    position = 0
+    for _, paragraph in batch:
+        starts.append(position)
+        position += len(paragraph) + len(PARAGRAPHS_SEPARATOR)
+    errors = [[] for _ in batch]
+    for offset, error in check_text(grammar_checker, text):
+        index = bisect_right(starts, offset) - 1
+        paragraph = batch[index][1]
+        if error.get('errorlength') is None:
+            context = error.get('context')
+        else:
+            context = error_context(paragraph, offset - starts[index],
+                                    int(error.get('errorlength')))
+        errors[index].append((dict(error.attrib), context))
+    return errors
+
+
+def check_batches(grammar_checker, batches, max_concurrency=1):
+    """ checks batches of paragraphs keeping up to max_concurrency requests
+    in flight; yields (page number, paragraph, errors) in order of batches,
+    where errors is list of (error attributes, context) """
+    def check(batch):
+        """ returns batch and its found errors """
+        return batch, check_batch(grammar_checker, batch)
+    threads = None
+    if max_concurrency > 1:
+        threads = ThreadPool(max_concurrency)
+        results = threads.imap(check, batches)
+    else:
+        results = imap(check, batches)
+    try:
+        for batch, errors in results:
+            for (num, paragraph), paragraph_errors in izip(batch, errors):
+                yield num, paragraph, paragraph_errors
+    finally:
+        if threads is not None:
+            threads.terminate()
+
+
+def grammar_cache_key(text, language, version, parameters=None):
+    """ returns key of paragraph checks results in grammar cache, results
+    depend on request parameters too """
+    fields = (version, language, text)
+    if parameters:
+        fields += tuple('%s=%s' % i for i in sorted(parameters.items()))
+    return sha256('\0'.join(fields)).hexdigest()
+
+
+def cached_grammar_checks(paragraphs, language, version, parameters=None):
+    """ returns dict of cached errors lists of paragraphs texts """
+    keys = dict((grammar_cache_key(text, language, version, parameters), text)
+                for _, text in paragraphs)
+    return dict((keys[key], errors) for key, errors
+                in GRAMMAR_CACHE.get_many(keys.keys()).iteritems())
+
+
+def cache_grammar_checks(checks, language, version, parameters=None):
+    """ stores errors lists of paragraphs texts in grammar cache """
+    GRAMMAR_CACHE.set_many(
+        (grammar_cache_key(text, language, version, parameters), errors)
+        for text, errors in checks.iteritems())
+
+
+def selected_rules(rules):
+    """ returns set of Language Tool rules names of rules option - comma
+    separated messages ids or rules names, or None if it's 'all' """
+    if rules.strip().lower() == 'all':
+        return None
+    names = dict((msg['id'], msg['msg_name']) for msg in MESSAGES)
+    return set(names.get(rule.strip(), rule.strip())
+               for rule in rules.replace('\n', ',').split(',')
+               if rule.strip())
+
+
+def rules_parameters(rules, disabled):
+    """ returns Language Tool server request parameters that turn off rules
+    which aren't reported - the ones that aren't in rules(None for all) or
+    are disabled; other rules(language-tool message) can be turned off only
+    by enabling the rest of rules explicitly """
+    other = set([MESSAGES_BY_RULES['language-tool']['msg_name']])
+    known = set(MESSAGES_BY_RULES) - other
+    if (rules is None or other & rules) and not other & disabled:
+        off = disabled - other
+        if rules is not None:
+            off |= known - rules
+        return {'disabled': ','.join(sorted(off))} if off else {}
+    enabled = (known if rules is None else rules) - disabled - other
+    return {'enabled': ','.join(sorted(enabled)), 'enabledOnly': 'yes'}
+
+
+def checked_rules(rules, disabled_messages):
+    """ returns (rules, disabled, parameters, in_process) for rules option
+    and disabled messages ids: reported rules names(None for all), disabled
+    rules names, server request parameters(see rules_parameters) and
+    whether rules are checked in process(see language_tool_rules) """
+    rules = selected_rules(rules)
+    disabled = selected_rules(','.join(disabled_messages))
+    parameters = rules_parameters(rules, disabled)
+    if 'enabledOnly' in parameters:
+        rules = set(parameters['enabled'].split(',')) - set([''])
+    in_process = rules is not None and rules.issubset(RULES)
+    return rules, disabled, parameters, in_process
+
+
+def prestart_servers(servers='1', prestart='True', rules='all',
+                     cds='False', heap='', gc='', threads='',
+                     disabled_messages=(), **kwargs):
+    """ starts Language Tool servers that checker with the same args(see
+    main) needs by background threads and returns them; servers are
+    registered, so the checker takes them instead of starting new ones and
+    stops them as usual. It's called by slidelint before the document is
+    parsed, so JVM start up overlaps parsing even if the checker is started
+    after it """
+    # gc is name of checker option
+    # pylint: disable=C0103,R0913,W0613
+    if prestart.lower() != 'true' or \
+            checked_rules(rules, disabled_messages)[3]:
+        return []
+
+    def start(instance):
+        """ starts server instance if it isn't running """
+        try:
+            get_languagetool_port_and_pid(
+                LT_PATH, registry_file(instance),
+                server_settings(LT_PATH, cds, heap, gc, threads))
+        # the checker reports the failure when it starts the server itself
+        except Exception:  # pylint: disable=W0703
+            LOGGER.debug("can't prestart Language Tool server",
+                         exc_info=True)
+    starters = [threading.Thread(target=start, args=(instance,))
+                for instance in range(int(servers))]
+    for starter in starters:
+        # slidelint doesn't wait for servers it may not need
+        starter.daemon = True
+        starter.start()
+    return starters
+
+
+BATCHES = ('paragraph', 'page', 'document')
+
+
 @help_wrapper(MESSAGES)
-def main(target_file=None, keep_alive='False'):
-    """ language tool based grammar checker """
+def main(target_file=None, keep_alive='False', batch='document',
+         batch_size='2000', max_concurrency='4', cache='True', servers='1',
+         prestart='True', rules='all', cds='False', heap='', gc='',
+         threads='', disabled_messages=(), pages_text=None):
+    """ language tool based grammar checker; paragraphs are joined into
+    one request per batch - 'paragraph', 'page' or 'document' which size
+    is limited by batch_size characters, up to max_concurrency requests are
+    processed by servers at once; if cache is True paragraphs checks results
+    are cached, so unchanged paragraphs aren't checked again; servers is the
+    number of Language Tool servers requests are spread over, if prestart is
+    True they are started while the document is parsed; rules are reported
+    rules, if all of them are mechanical ones(see language_tool_rules) they
+    are checked in process without Language Tool server; cds, heap, gc and
+    threads are settings of started servers(see server_settings); rules of
+    disabled_messages ids aren't checked by server at all. Pages are
+    extracted from the document by background thread, so paragraphs of the
+    first pages are checked while the next ones are parsed; pages_text is
+    list of paragraphs per page that slidelint gives while it parses the
+    document(see cli.parse_document) """
+    # gc is name of checker option
+    # pylint: disable=C0103,R0912,R0913,R0914
     keep_alive = keep_alive.lower() == 'true'
-    pages = convert_pdf_to_text(target_file)
+    if batch not in BATCHES:
+        raise ValueError("batch should be one of %s" % ", ".join(BATCHES))
+    size_limit = 0 if batch == 'paragraph' else int(batch_size)
+    max_concurrency = int(max_concurrency)
+    rules, disabled, parameters, in_process = checked_rules(
+        rules, disabled_messages)
+    version = not in_process and cache.lower() == 'true' and \
+        languagetool_version(LT_PATH)
+    settings = server_settings(LT_PATH, cds, heap, gc, threads)
+    servers_args = (LT_PATH, int(servers), keep_alive, max_concurrency,
+                    settings)
+    servers_pool = None
+    if prestart.lower() == 'true' and not in_process:
+        servers_pool = start_servers_pool(*servers_args)
+    # paragraphs and cached checks of already extracted pages
+    paragraphs = []
+    checks = {}
+
+    def unchecked_paragraphs():
+        """ yields unique not cached paragraphs of extracted pages """
+        seen = set()
+        if pages_text is None:
+            pages = pages_in_background(stream_pages_text(target_file))
+        else:
+            pages = pages_in_background(pages_text)
+        for page_num, page in enumerate(pages):
+            page = list(pages_paragraphs([page], page_num))
+            paragraphs.extend(page)
+            unique = [paragraph for paragraph in unique_paragraphs(page)
+                      if paragraph[1] not in seen]
+            seen.update(paragraph[1] for paragraph in unique)
+            if version:
+                checks.update(cached_grammar_checks(unique, LANGUAGE,
+                                                    version, parameters))
+            for paragraph in unique:
+                if paragraph[1] not in checks:
+                    yield paragraph
+    try:
+        unchecked = unchecked_paragraphs()
+        first = next(unchecked, None)
+        if first is not None:
+            found = {}
+            if in_process:
+                pool, max_concurrency = RulesChecker(rules), 1
+            # servers are waited for only when there is text to check
+            elif servers_pool:
+                pool = servers_pool.get()
+            else:
+                pool = LanguagetoolServersPool(*servers_args)
+            servers_pool = None
+            with pool as grammar_checker:
+                if parameters and not in_process:
+                    grammar_checker = partial(grammar_checker,
+                                              parameters=parameters)
+                # the next pages are extracted while batches are checked
+                batches = paragraphs_batches(chain([first], unchecked),
+                                             size_limit, batch == 'page')
+                for _, text, errors in check_batches(
+                        grammar_checker, batches, max_concurrency):
+                    found[text] = errors
+            if version:
+                cache_grammar_checks(found, LANGUAGE, version, parameters)
+            checks.update(found)
+    finally:
+        if servers_pool is not None:
+            close_servers_pool(servers_pool)
     rez = []
-    with LanguagetoolServer(LT_PATH, keep_alive) as grammar_checker:
-        for num, page in enumerate(pages):
-            for paragraph in page:
-                # fixing new-lines and spaces for languagetool
-                for error in grammar_checker(new_lines_replaser(paragraph)):
-                    rule_id = error.get('ruleId')
-                    cur_msg = MESSAGES_BY_RULES.get(
-                        rule_id,
-                        MESSAGES_BY_RULES['language-tool'])
-                    rez.append({
-                        'id': cur_msg['id'],
-                        'page': 'Slide %s' % (num + 1),
-                        'msg_name': rule_id,
-                        'msg': '%s - %s' % (error.get('locqualityissuetype'),
-                                            error.get('msg')),
-                        'help': error.get('context')})
+    for num, text in paragraphs:
+        for error, context in checks[text]:
+            rule_id = error.get('ruleId')
+            cur_msg = MESSAGES_BY_RULES.get(
+                rule_id,
+                MESSAGES_BY_RULES['language-tool'])
+            if (rules is not None and rule_id not in rules and
+                    cur_msg['msg_name'] not in rules) or rule_id in disabled:
+                continue
+            rez.append({
+                'id': cur_msg['id'],
+                'page': 'Slide %s' % (num + 1),
+                'msg_name': rule_id,
+                'msg': '%s - %s' % (error.get('locqualityissuetype'),
+                                    error.get('msg')),
+                'help': context})
     return rez
+
+
+# slidelint starts servers before parsing the document(see cli.lint)
+main.prestart = prestart_servers
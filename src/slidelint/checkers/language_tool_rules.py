@@ -0,0 +1,105 @@
+""" Pure-Python implementation of mechanical Language Tool rules. These rules
+are simple text patterns, so they are checked in process, without Language
+Tool server and its JVM start up; errors are reported as Language Tool server
+reports them(see RulesChecker) """
+import re
+from lxml import etree
+
+# words with trailing dot that don't end sentence
+ABBREVIATIONS = ('e.g', 'i.e', 'etc', 'vs', 'cf', 'approx', 'incl', 'Mr',
+                 'Mrs', 'Ms', 'Dr', 'Prof', 'Inc', 'Ltd', 'Jr', 'Sr', 'St',
+                 'No', 'Fig', 'p', 'pp')
+SENTENCE_END = re.compile(r'(\S*?)([.!?]+)["\')\]]*\s+|\n\n')
+LOWERCASE_WORD = re.compile(r"\s*([a-z][a-z'-]*)\b")
+
+COMMA_PARENTHESIS = (
+    (re.compile(r'(?<=\S) +,'),
+     "Put a space after the comma, but not before the comma"),
+    (re.compile(r',(?=[A-Za-z])'),
+     "Put a space after the comma, but not before the comma"),
+    (re.compile(r'\( +'),
+     "Don't put a space after the opening parenthesis"),
+    (re.compile(r'(?<=\S) +\)'),
+     "Don't put a space before the closing parenthesis"))
+# ellipsis, decimals, file extensions and smileys aren't punctuation
+PUNCTUATION = re.compile(r'(?<=\w) +([?!;]|:(?![()DPp]\B)|\.(?![\w.]))')
+
+
+def whitespace_rule(text):
+    """ yields (offset, length, message, issue type) of repeated
+    whitespaces, the ones at parentheses and punctuation marks are left to
+    the other rules """
+    for match in re.finditer(r'(?<=[^\s(]) {2,}(?=[^\s),.?!:;])', text):
+        yield (match.start(), len(match.group()),
+               "Possible typo: you repeated a whitespace", 'whitespace')
+
+
+def comma_parenthesis_whitespace(text):
+    """ yields (offset, length, message, issue type) of whitespaces before
+    comma or closing parenthesis, after opening parenthesis and of missed
+    whitespace after comma """
+    for pattern, msg in COMMA_PARENTHESIS:
+        for match in pattern.finditer(text):
+            yield match.start(), len(match.group()), msg, 'whitespace'
+
+
+def sentences_starts(text):
+    """ yields offsets of text sentences starts """
+    yield 0
+    for match in SENTENCE_END.finditer(text):
+        word, marks = match.group(1), match.group(2)
+        if marks == '...' or (marks == '.' and (
+                word in ABBREVIATIONS or '.' in word or len(word) == 1)):
+            continue
+        yield match.end()
+
+
+def uppercase_sentence_start(text):
+    """ yields (offset, length, message, issue type) of sentences that start
+    with lowercase word, words like 'iPhone' or 'x86' are fine """
+    for start in sentences_starts(text):
+        match = LOWERCASE_WORD.match(text, start)
+        if match:
+            yield (match.start(1), len(match.group(1)),
+                   "This sentence does not start with an uppercase letter",
+                   'typographical')
+
+
+def whitespace_punctuation(text):
+    """ yields (offset, length, message, issue type) of whitespaces before
+    punctuation marks """
+    for match in PUNCTUATION.finditer(text):
+        yield (match.start(), len(match.group()),
+               "Don't put a space before the punctuation mark", 'whitespace')
+
+
+RULES = {
+    'WHITESPACE_RULE': whitespace_rule,
+    'COMMA_PARENTHESIS_WHITESPACE': comma_parenthesis_whitespace,
+    'UPPERCASE_SENTENCE_START': uppercase_sentence_start,
+    'WHITESPACE_PUNCTUATION': whitespace_punctuation}
+
+
+class RulesChecker(object):
+    """ Works as LanguagetoolServer, but it checks only given rules(all of
+    RULES by default) in process """
+    def __init__(self, rules=None):
+        self.rules = sorted(RULES if rules is None else rules)
+
+    def grammar_checker(self, text, language=None):
+        """ returns errors of text as Language Tool server 'error' elements,
+        language is ignored as rules are the same for English variants """
+        # pylint: disable=W0613
+        errors = []
+        for rule_id in self.rules:
+            for offset, length, msg, issue in RULES[rule_id](text):
+                errors.append(etree.Element(
+                    'error', ruleId=rule_id, msg=msg, offset=str(offset),
+                    errorlength=str(length), locqualityissuetype=issue))
+        return sorted(errors, key=lambda error: int(error.get('offset')))
+
+    def __enter__(self):
+        return self.grammar_checker
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
@@ -0,0 +1,589 @@
+""" Language Tool servers: servers processes are launched with JVM
+settings and optional AppCDS archive, theirs output goes to rotated logs
+and they are registered, so slidelint processes share running servers;
+LanguagetoolServer and LanguagetoolServersPool send checks to them and
+restart failed ones """
+import io
+import os
+import re
+import json
+import time
+import fcntl
+import random
+import shutil
+import socket
+import subprocess
+import threading
+import zipfile
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from multiprocessing.pool import ThreadPool
+from lxml import etree
+from appdirs import user_data_dir
+import requests
+from requests.adapters import HTTPAdapter
+
+# language of checks
+LANGUAGE = "en-US"
+# timeout of requests to a server that hasn't answered yet, after that it's
+# TIMEOUT_FACTOR times of expected by server speed time, within the limits
+TIMEOUT = 15
+MIN_TIMEOUT = 3
+MAX_TIMEOUT = 60
+TIMEOUT_FACTOR = 10
+# failed requests are retried after BACKOFF, 2 * BACKOFF, ... seconds,
+# server is restarted after RESTART_AFTER failures in a row
+RETRIES = 2
+BACKOFF = 0.5
+RESTART_AFTER = 3
+# errors of failed check requests
+CHECK_ERRORS = (requests.exceptions.RequestException, etree.XMLSyntaxError)
+# server output goes to log next to its registry, log that is bigger than
+# LOG_SIZE is rotated, LOG_BACKUPS previous logs are kept
+LOG_SIZE = 1024 * 1024
+LOG_BACKUPS = 2
+# JVM garbage collectors by gc option, JVM skips options it doesn't know,
+# e.g. AppCDS ones of old Java versions
+GARBAGE_COLLECTORS = {'serial': 'SerialGC', 'parallel': 'ParallelGC',
+                      'g1': 'G1GC', 'shenandoah': 'ShenandoahGC', 'z': 'ZGC'}
+JVM_OPTIONS = ['-XX:+IgnoreUnrecognizedVMOptions']
+# text that is checked while AppCDS archive is built, so classes of checks
+# are archived as well as classes of server start
+CDS_SAMPLE = "This are a example sentence, witch is checked twice twice."
+
+
+def languagetool_version(lt_path):
+    """ returns version of Language Tool server jar or None if there is no
+    jar, it's taken from jar manifest or it's jar modification time """
+    jar = os.path.join(lt_path, 'languagetool-server.jar')
+    try:
+        with zipfile.ZipFile(jar) as archive:
+            manifest = archive.read('META-INF/MANIFEST.MF')
+    except (IOError, KeyError, zipfile.BadZipfile):
+        return None
+    version = re.search(r'^Implementation-Version:\s*(\S+)', manifest, re.M)
+    return version.group(1) if version else str(os.path.getmtime(jar))
+
+
+def get_free_port():
+    """ returns unused port number"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+    sock.bind(('', 0))
+    sock.listen(socket.SOMAXCONN)
+    _, port = sock.getsockname()
+    sock.close()
+    return str(port)
+
+
+def server_command(lt_path, port, jvm_options=(), server_options=()):
+    """ returns command that runs Language Tool server on port """
+    return ['java'] + list(jvm_options) + [
+        '-cp', os.path.join(lt_path, 'languagetool-server.jar'),
+        'org.languagetool.server.HTTPServer', '--port', port] + \
+        list(server_options)
+
+
+def server_settings(lt_path, cds='False', heap='', collector='',
+                    threads=''):
+    """ returns settings of started servers for checker options - cds is
+    'True' for AppCDS archive in slidelint user data dir, path of archive or
+    'False', heap is max JVM heap size(e.g. 512m), collector is gc option -
+    one of GARBAGE_COLLECTORS and threads is number of checks server runs at
+    once; empty options are left to JVM and Language Tool defaults """
+    collector = collector.strip().lower()
+    if collector and collector not in GARBAGE_COLLECTORS:
+        raise ValueError("gc should be one of %s" % ", ".join(
+            sorted(GARBAGE_COLLECTORS)))
+    archive = None
+    if cds.strip().lower() == 'true':
+        version = languagetool_version(lt_path)
+        if version is not None:
+            archive = os.path.join(user_data_dir('slidelint'),
+                                   'languagetool-%s.jsa' % version)
+    elif cds.strip().lower() != 'false':
+        archive = os.path.expanduser(cds.strip())
+    return {'archive': archive,
+            'heap': heap.strip(),
+            'gc': collector,
+            'threads': threads and int(threads)}
+
+
+def launch_options(config_file, settings):
+    """ returns (JVM options, Language Tool server options) of server with
+    config_file registry for settings(see server_settings); server threads
+    are set by server config file next to the registry """
+    settings = settings or {}
+    jvm_options = list(JVM_OPTIONS)
+    if settings.get('heap'):
+        jvm_options.append('-Xmx%s' % settings['heap'])
+    if settings.get('gc'):
+        jvm_options.append(
+            '-XX:+Use%s' % GARBAGE_COLLECTORS[settings['gc']])
+    server_options = []
+    if settings.get('threads'):
+        properties = config_file + '.properties'
+        with open(properties, 'w') as stream:
+            stream.write('maxCheckThreads=%s\n' % settings['threads'])
+        server_options = ['--config', properties]
+    return jvm_options, server_options
+
+
+def server_log(config_file):
+    """ returns path of log of server with config_file registry """
+    return config_file + '.log'
+
+
+def rotate_log(path, size_limit=LOG_SIZE, backups=LOG_BACKUPS):
+    """ moves content of log that is bigger than size_limit to backup file;
+    the log is truncated in place as running server keeps it open, its
+    writes go to the new end of the log as it's opened in append mode """
+    try:
+        if os.path.getsize(path) <= size_limit:
+            return
+    except OSError:
+        return
+    for index in range(backups - 1, 0, -1):
+        backup = '%s.%s' % (path, index)
+        if os.path.exists(backup):
+            os.rename(backup, '%s.%s' % (path, index + 1))
+    if backups:
+        shutil.copyfile(path, path + '.1')
+    with open(path, 'r+') as log:
+        log.truncate()
+
+
+def launch_server(cmd, log_path):
+    """ runs server cmd and waits for its start, returns its process;
+    server output goes to log file, not to pipe, so long running server
+    never blocks on full pipe that nobody reads """
+    rotate_log(log_path)
+    offset = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    with open(log_path, 'a') as log:
+        process = subprocess.Popen(
+            cmd,
+            stdout=log,
+            stderr=subprocess.STDOUT)
+    # waiting for server start
+    output = []
+    # io file is used, as reads of builtin one may stop at the first EOF
+    with io.open(log_path, 'rb') as log:
+        log.seek(offset)
+        while True:
+            # all output of exited process is already in the log
+            retcode = process.poll()
+            output.append(log.read())
+            if 'Server started' in ''.join(output):
+                return process
+            if retcode is not None:
+                output.insert(
+                    0,
+                    "languagetool-server died with exit code %s!\n" % retcode
+                )
+                output.insert(1, " ".join(cmd) + "\n")
+                output.append("\nLanguageTool requires Java 7 or later."
+                              " Please check and update java version."
+                              " For more details look at "
+                              "http://help.ubuntu.com/community/Java\n")
+                raise IOError("".join(output))
+            time.sleep(0.05)
+
+
+def build_cds_archive(lt_path, archive, config_file, settings):
+    """ builds AppCDS archive of Language Tool server classes: server that
+    dumps its classes at exit is started, it checks sample text and it's
+    stopped. JVM that can't dump classes(Java older than 13) leaves empty
+    archive, so it isn't built again; remove it to try again """
+    jvm_options, server_options = launch_options(config_file, settings)
+    port = get_free_port()
+    # each server dumps to its own file, so the archive appears at once
+    dump = '%s.%s' % (archive, port)
+    jvm_options.append('-XX:ArchiveClassesAtExit=%s' % dump)
+    try:
+        process = launch_server(
+            server_command(lt_path, port, jvm_options, server_options),
+            server_log(config_file))
+    # the server is started without archive as usual
+    except (IOError, OSError):
+        process = None
+    if process is not None:
+        try:
+            requests.post('http://127.0.0.1:%s' % port,
+                          data={'language': LANGUAGE, 'text': CDS_SAMPLE},
+                          timeout=MAX_TIMEOUT)
+        except requests.exceptions.RequestException:
+            pass
+        finally:
+            # classes are dumped on graceful shut down only
+            process.terminate()
+            process.wait()
+    archive_dir = os.path.dirname(archive)
+    if archive_dir and not os.path.exists(archive_dir):
+        os.makedirs(archive_dir)
+    if os.path.exists(dump):
+        os.rename(dump, archive)
+    else:
+        open(archive, 'a').close()
+
+
+def start_languagetool_server(lt_path, config_file, settings=None):
+    """ starts languagetool_server with settings(see server_settings),
+    returns its port and pid; server output goes to log file(see
+    server_log) """
+    archive = (settings or {}).get('archive')
+    if archive and not os.path.exists(archive):
+        build_cds_archive(lt_path, archive, config_file, settings)
+    jvm_options, server_options = launch_options(config_file, settings)
+    if archive and os.path.getsize(archive):
+        jvm_options.append('-XX:SharedArchiveFile=%s' % archive)
+    port = get_free_port()
+    process = launch_server(
+        server_command(lt_path, port, jvm_options, server_options),
+        server_log(config_file))
+    pid = process.pid
+    write_registry(config_file, {'port': port,
+                                 'pid': pid,
+                                 'version': languagetool_version(lt_path),
+                                 'started': time.time()})
+    return port, pid
+
+
+@contextmanager
+def registry_lock(config_file):
+    """ exclusive lock of server registry file, it's held while server is
+    checked or started, so only one slidelint process(or thread) starts the
+    server and the others wait until it's ready """
+    with open(config_file + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_registry(config_file):
+    """ returns dict with port, pid, jar version and start time of
+    registered server, or None if there is no one """
+    try:
+        with open(config_file, 'r') as in_file:
+            content = in_file.read().strip(' \n')
+    except IOError:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        # registry of previous slidelint versions
+        try:
+            port, pid = content.split(',')
+        except ValueError:
+            return None
+        return {'port': port, 'pid': pid}
+
+
+def write_registry(config_file, entry):
+    """ atomically replaces registry entry, readers never see partly
+    written file """
+    with NamedTemporaryFile(dir=os.path.dirname(config_file) or '.',
+                            delete=False) as out_file:
+        json.dump(entry, out_file)
+    os.rename(out_file.name, config_file)
+
+
+def process_running(pid):
+    """ checks whether process with pid is running; killed process that
+    isn't reaped by its parent yet(zombie) is not running """
+    try:
+        with open("/proc/%s/stat" % pid) as stat:
+            # process state follows its name that is in parentheses
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (IOError, IndexError):
+        return False
+
+
+def registered_server(lt_path, config_file):
+    """ returns (port, pid) of registered server if it's running and it's
+    server of the current Language Tool jar, otherwise None """
+    entry = read_registry(config_file)
+    if entry is None or not process_running(entry['pid']):
+        return None
+    version = entry.get('version', None)
+    if version not in (None, languagetool_version(lt_path)):
+        # server of replaced jar
+        os.kill(int(entry['pid']), 9)
+        return None
+    return str(entry['port']), int(entry['pid'])
+
+
+def get_languagetool_port_and_pid(lt_path, config_file, settings=None):
+    """ checks if languagetool is running and stats it with settings if
+    not; returns its ports and pid"""
+    with registry_lock(config_file):
+        server = registered_server(lt_path, config_file)
+        if server is not None:
+            # log of long running server is rotated by its users
+            rotate_log(server_log(config_file))
+            return server
+        return start_languagetool_server(lt_path, config_file, settings)
+
+
+def restart_languagetool_server(lt_path, config_file, pid, settings=None):
+    """ kills server with pid and starts new one; if the registered server
+    was already restarted by other process, it's used instead;
+    returns port and pid of running server """
+    with registry_lock(config_file):
+        server = registered_server(lt_path, config_file)
+        if server is not None and server[1] != pid:
+            return server
+        if process_running(pid):
+            os.kill(pid, 9)
+        return start_languagetool_server(lt_path, config_file, settings)
+
+
+def registry_file(instance=0):
+    """ returns path of registry file of server instance in servers pool """
+    config_dir = user_data_dir('slidelint')
+    if not os.path.exists(config_dir):
+        os.makedirs(config_dir)
+    return os.path.join(config_dir,
+                        'run-%s' % instance if instance else 'run')
+
+
+# http sessions of running processes per Language Tool server url
+_SESSIONS = {}
+
+
+def get_session(url, pool_size=10):
+    """ returns http session with pool of keep-alive connections to url;
+    session is created once per process and reused by all checks """
+    key = (os.getpid(), url)
+    if key not in _SESSIONS:
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1,
+                                             pool_maxsize=pool_size))
+        _SESSIONS[key] = session
+    return _SESSIONS[key]
+
+
+def close_session(url):
+    """ closes http session of url, e.g. of killed server """
+    session = _SESSIONS.pop((os.getpid(), url), None)
+    if session is not None:
+        session.close()
+
+
+class LanguagetoolServer(object):
+    """ Class for allowing to work with LanguagetoolServer as
+    with context object; instance is the number of server in servers pool,
+    settings are settings of started server(see server_settings) """
+    def __init__(self, lt_path, keep_alive=False, pool_size=10, instance=0,
+                 settings=None):
+        self.keep_alive = keep_alive
+        self.settings = settings
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        self.config_file = registry_file(instance)
+        self.lt_path = lt_path
+        self.port, self.pid = get_languagetool_port_and_pid(
+            self.lt_path, self.config_file, self.settings)
+        self.url = 'http://127.0.0.1:%s' % self.port
+        self.session = get_session(self.url, self.pool_size)
+        # seconds per checked character, failed requests in a row and
+        # thread that restarts the server
+        self.speed = None
+        self.failures = 0
+        self.restarting = None
+
+    def restart(self, url=None):
+        """ kills server and starts new one, the http session is recreated
+        as connections to killed server are useless; url is the url of
+        failed request, if the server was already restarted by other thread
+        it isn't restarted again """
+        with self.lock:
+            if url is not None and url != self.url:
+                return
+            close_session(self.url)
+            self.port, self.pid = restart_languagetool_server(
+                self.lt_path, self.config_file, self.pid, self.settings)
+            self.url = 'http://127.0.0.1:%s' % self.port
+            self.session = get_session(self.url, self.pool_size)
+            self.speed = None
+            self.failures = 0
+
+    def restart_in_background(self, url):
+        """ restarts server by separate thread, requests wait for it
+        instead of being sent to failed server """
+        def restart():
+            """ restarts the server and marks restart as finished """
+            try:
+                self.restart(url)
+            finally:
+                self.restarting = None
+        self.restarting = threading.Thread(target=restart)
+        self.restarting.daemon = True
+        self.restarting.start()
+
+    def alive(self):
+        """ checks whether server process is running """
+        return process_running(self.pid)
+
+    def available(self):
+        """ checks whether server takes requests - it's running and it isn't
+        being restarted; dead server is restarted in background """
+        if self.restarting is not None:
+            return False
+        with self.lock:
+            if self.restarting is None and not self.alive():
+                self.restart_in_background(self.url)
+            return self.restarting is None
+
+    def timeout(self, text):
+        """ returns timeout of request with text by observed server speed """
+        if self.speed is None:
+            return TIMEOUT
+        expected = self.speed * (len(text) + 1)
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_FACTOR * expected))
+
+    def succeeded(self, text, elapsed):
+        """ takes into account time of successful request """
+        speed = elapsed / (len(text) + 1)
+        with self.lock:
+            self.failures = 0
+            self.speed = speed if self.speed is None else \
+                self.speed + (speed - self.speed) / 5
+        return speed
+
+    def failed(self, url):
+        """ counts failed request to url, dead server or server that failed
+        RESTART_AFTER times in a row is restarted in background """
+        with self.lock:
+            if url != self.url or self.restarting is not None:
+                return
+            self.failures += 1
+            if self.failures >= RESTART_AFTER or not self.alive():
+                self.restart_in_background(url)
+
+    def grammar_checker(self, text, language=LANGUAGE, parameters=None):
+        """ sends text to Languagetool Server and returns its checks results,
+        parameters are extra request parameters(see rules_parameters); it's
+        safe to call it from many threads. Failed requests are retried
+        with growing delays, timed out ones aren't - the same text would be
+        checked too long again, so it's up to caller to split it """
+        data = dict(parameters or {}, language=language, text=text)
+        for attempt in range(RETRIES + 1):
+            restarting = self.restarting
+            if restarting is not None:
+                restarting.join()
+            url, session = self.url, self.session
+            started = time.time()
+            try:
+                response = session.post(url, data=data,
+                                        timeout=self.timeout(text))
+                response.raise_for_status()
+                root = etree.fromstring(response.text.encode('utf-8'))
+            except CHECK_ERRORS, error:
+                # after tense LanguagetoolServer are freezing,
+                # so it's needs a restart
+                self.failed(url)
+                if attempt == RETRIES or \
+                        isinstance(error, requests.exceptions.Timeout):
+                    raise
+                time.sleep(BACKOFF * 2 ** attempt * random.uniform(1, 1.5))
+                continue
+            self.succeeded(text, time.time() - started)
+            return root.findall('error')
+
+    def __enter__(self):
+        return self.grammar_checker
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        restarting = self.restarting
+        if restarting is not None:
+            restarting.join()
+        if not self.keep_alive:
+            os.kill(self.pid, 9)
+            close_session(self.url)
+
+
+class LanguagetoolServersPool(object):
+    """ Pool of Language Tool servers that works as LanguagetoolServer; each
+    request is sent to the least loaded server, servers are checked before
+    requests and restarted independently in background, so a failed server
+    doesn't stop the others """
+    def __init__(self, lt_path, size=1, keep_alive=False, pool_size=10,
+                 settings=None):
+        self.lock = threading.Lock()
+        self.loads = [0] * size
+
+        def start(instance):
+            """ starts server instance """
+            return LanguagetoolServer(lt_path, keep_alive, pool_size,
+                                      instance, settings)
+        if size > 1:
+            # servers are started concurrently
+            starter = ThreadPool(size)
+            try:
+                self.servers = starter.map(start, range(size))
+            finally:
+                starter.terminate()
+        else:
+            self.servers = [start(0)]
+
+    def acquire(self):
+        """ returns index of the least loaded available server(see
+        LanguagetoolServer.available) and counts request to it, servers that
+        are being restarted are taken only if all of them are; ties are
+        broken randomly, so many processes don't load the same server """
+        servers = self.servers
+        with self.lock:
+            order = sorted(range(len(servers)),
+                           key=lambda i: (servers[i].restarting is not None,
+                                          self.loads[i], random.random()))
+            index = next((i for i in order if servers[i].available()),
+                         order[0])
+            self.loads[index] += 1
+        return index
+
+    def grammar_checker(self, text, language=LANGUAGE, parameters=None):
+        """ sends text to the least loaded alive server and returns its
+        checks results """
+        index = self.acquire()
+        try:
+            return self.servers[index].grammar_checker(text, language,
+                                                       parameters)
+        finally:
+            with self.lock:
+                self.loads[index] -= 1
+
+    def __enter__(self):
+        return self.grammar_checker
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        for server in self.servers:
+            server.__exit__(exc_type, exc_value, exc_traceback)
+
+
+def start_servers_pool(*args):
+    """ starts LanguagetoolServersPool with args in background thread, so
+    servers start while the caller does something else; returns AsyncResult
+    of the pool """
+    starter = ThreadPool(1)
+    servers_pool = starter.apply_async(LanguagetoolServersPool, args)
+    starter.close()
+    return servers_pool
+
+
+def close_servers_pool(servers_pool):
+    """ closes servers pool that was started in advance and isn't needed as
+    soon as it's started; it's done by daemon thread, so the caller doesn't
+    wait for servers start up. Returns the thread """
+    def close():
+        """ waits for servers pool and closes it as usual """
+        try:
+            pool = servers_pool.get()
+        # the servers weren't needed, so theirs failure doesn't matter
+        except (IOError, OSError):
+            return
+        pool.__exit__(None, None, None)
+    closer = threading.Thread(target=close)
+    closer.daemon = True
+    closer.start()
+    return closer
@@ -5,7 +5,6 @@ import tempdir
 import subprocess
 from lxml import html
 from slidelint.pdf_utils import document_pages_layouts
-from pdfminer.layout import LTChar, LTTextLine, LTTextBox
 from PIL import Image
 import re
 from math import exp
@@ -18,28 +17,15 @@ MESSAGES = (
          help="Projectors are notorious for not having good contrast."),)
 
 
-def layout_characters(layout):
-    """ yields character boxes or character for layout"""
-    for item in layout:
-        if isinstance(item, LTChar):
-            # pylint: disable=W0212
-            if not 'cid' in item._text:
-                if ord(item._text) > 32:
-                    yield item
-        elif isinstance(item, LTTextLine):
-            yield [i for i in layout_characters(item)]
-        elif isinstance(item, LTTextBox):
-            for i in layout_characters(item):
-                yield i
-
-
-def tranform2html(source, dist, out_name='out.html'):
+def tranform2html(source, dist, out_name='out.html', first=None, last=None):
     """ pdftohtml wrapper for transforming PDF to HTML with
     page background images, it returns raw html and list of full
-    images paths"""
+    images paths; first and last limits range of converted pages"""
     outpath = os.path.join(dist, out_name)
-    cmd = ['pdftohtml', '-c', '-noframes', '-zoom', '1',
-           source, outpath]
+    cmd = ['pdftohtml', '-c', '-noframes', '-zoom', '1']
+    if first is not None:
+        cmd += ['-f', str(first), '-l', str(last)]
+    cmd += [source, outpath]
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
@@ -97,8 +83,8 @@ class TextColorExtractor(object):
 def get_text_color_and_background(text_colors, page_layout, page_background):
     """ yields character text, color and background """
     # pylint: disable=R0914
-    for characters in layout_characters(page_layout):
-        text_set = [i._text for i in characters]  # pylint: disable=W0212
+    for characters in page_layout.characters.lines():
+        text_set = [i.text for i in characters]
         first = ''.join(text_colors['text']).find(''.join(text_set))
         last = first + len(text_set)
         text_range = slice(first, last)
@@ -115,14 +101,21 @@ def get_text_color_and_background(text_colors, page_layout, page_background):
 
 
 def goes_throught_pages(source):
-    """ yields characters info and its background per page """
+    """ yields characters info and its background per page, only pages
+    of loaded document are rendered, with a single pdftohtml run over
+    the span of them """
+    document_layout = list(document_pages_layouts(source))
+    if not document_layout:
+        return
+    first = document_layout[0][0]
+    last = document_layout[-1][0]
     with tempdir.TempDir() as dist:
-        raw_html, images = tranform2html(source, dist)
+        raw_html, images = tranform2html(
+            source, dist, first=first + 1, last=last + 1)
         color_extractor = TextColorExtractor(raw_html)
-        document_layout = document_pages_layouts(source)
-        for (page_num, page_layout), image in izip(document_layout, images):
-            page_background = Image.open(image)
-            page_text_colors = color_extractor(page_num)
+        for page_num, page_layout in document_layout:
+            page_background = Image.open(images[page_num - first])
+            page_text_colors = color_extractor(page_num - first)
             page_images = get_text_color_and_background(
                 page_text_colors, page_layout, page_background)
             yield page_num, page_images
@@ -1,10 +1,11 @@
 """
 Usage:
   slidelint help-msg [<msg_id>...]
-  slidelint [options] FILE
+  slidelint serve [options]
+  slidelint [options] PATH...
 
 Arguments:
-  FILE  Path to PDF presentation file
+  PATH  Path to PDF presentation file or to directory with presentations
   msg_id  id of slidelint message
 
 Options:
@@ -15,6 +16,21 @@ Options:
                                         (e.g. text,parseable,colorized,
                                         msvs,html) [default: text]
   --files-output
+  --client               send lint request to running slidelint daemon(see
+                         serve command) and print its report, if there is
+                         no running daemon files are linted as usual
+  --socket=<path>        path to unix socket of slidelint daemon
+  --unordered            print checkers messages as soon as each checker is
+                         done instead of checkers order
+  -w <n> --workers=<n>   run checkers by pool of n pre-warmed worker
+                         processes instead of a new process per checker,
+                         many files are always linted by pool(of cpu count
+                         workers by default)
+  -j <n> --jobs=<n>      number of processes for parsing PDF pages
+                         [default: 1]
+  --pages=<pages>        lint only given pages (e.g. 1-10,42)
+  --sample-every=<n>     lint only every n-th of (selected) pages
+                         [default: 1]
   -e <msg_ids> --enable=<msg_ids>  Enable the message, report, category or
                                    checker with the given id(s). You can either
                                    give multiple identifier separated by comma
@@ -26,18 +42,25 @@ Options:
                                     multiple time.
 
 """
-from docopt import docopt
+import os
+import sys
+from collections import deque, Counter
+from docopt import docopt, DocoptExit
 from slidelint.resources import PlugginsHandler
 from slidelint.config_parser import LintConfig
 from slidelint.outputs import output_handler
-from slidelint.utils import MultiprocessingManager
+from slidelint.utils import MultiprocessingManager, create_workers_pool, \
+    takes_argument, Feed
+from slidelint.pdf_utils import load_document, cache_document, \
+    parse_pages_option, stream_pages_text
 
 import logging
 LOGGER = logging.getLogger(__name__)
 
 
 def lint(target_file, config_file, output, enable_disable_ids,
-         msg_info, group="slidelint.pluggins"):
+         msg_info, group="slidelint.pluggins", parsing=None, pool=None,
+         composer=None):
     """ main function that bring all thing together: loads slidelint pluggins,
     parses config file, handles command-line options, runs checkers and
     formats output.
@@ -52,54 +75,374 @@ def lint(target_file, config_file, output, enable_disable_ids,
                      'msvs', 'html'],
             files_output - True or False, if True than report will be
                            written to file otherwise printed to stdout,
-            ids - if True then messages ids will be added to report
+            ids - if True then messages ids will be added to report,
+            unordered - if True then messages are reported in order of
+                        checkers completion,
+            stream - file-like object for report output, if it's omitted
+                     sys.stdout is used
         * enable_disable_ids - command-line options for enabling/disabling
                                messages/checkers/categories, takes
-        * msg_info -  ['list of messages ids,], None, or 'All' """
-    pluggins = PlugginsHandler(group=group)
-    config = LintConfig(config_file)
-    config.compose(pluggins.checkers, *enable_disable_ids)
+        * msg_info -  ['list of messages ids,], None, or 'All'
+        * parsing - it's a dict object for controlling PDF parsing or None:
+            jobs - number of processes for parsing PDF pages in parallel,
+            pages - pages specification(e.g. '1-10,42') or None,
+            sample_every - step of pages sampling, 1 for all pages
+        * pool - workers pool(see utils.create_workers_pool) for running
+                 checkers, if it's None each checker runs in new process
+        * composer - function that returns (pluggins, config) pair, takes
+                     the same args as compose_config(the default one), it
+                     allows to reuse already loaded pluggins and config
+
+    The target file is parsed only once, before checkers processes are
+    started, so all of them share the same document model; checkers that
+    take pages_text argument get pages text while the document is parsed
+    (see parse_document). Checkers prestart hooks are called before the
+    document is parsed(see prestart_checkers)."""
+    composer = composer or compose_config
+    pluggins, config = composer(config_file, enable_disable_ids, group)
     if msg_info:
-        # displaying help messages
-        rezult = []
-        for checker in pluggins.load_checkers():
-            kwargs = {'msg_info': msg_info}
-            kwargs.update(config.get_checker_args(checker.name))
-            rezult += list(checker.check(**kwargs))
+        rezult = messages_info(pluggins, config, msg_info)
         msg_ids = []
         output['ids'] = True
     else:
-        # run checkers
         # mute messaging from appearing in report
         msg_ids = config.disable_messages
-        checkers = pluggins.load_checkers(
-            categories=config.categories,
-            checkers=config.checkers_ids,
-            disabled_categories=config.disable_categories,
-            disabled_checkers=config.disable_checkers
-        )
-        # lets run all checkers separately in different processes
-        rezult = MultiprocessingManager()
-        for checker in checkers:
-            kwargs = {'target_file': target_file}
-            kwargs.update(config.get_checker_args(checker.name))
-            rezult.append(checker.check, kwargs)
+        checkers = enabled_checkers(pluggins, config)
+        rezult = lint_document(target_file, checkers, config, output,
+                               parsing, pool)
     return output_handler(target_file, rezult, msg_ids, output['format'],
-                          output['files_output'], output['ids'])
+                          output['files_output'], output['ids'],
+                          output.get('stream'))
 
 
-def cli():
-    """
-    User command line interface handler - parses command-line options and
-    run linting
-    """
-    args = docopt(__doc__)
-    target_file = args['FILE']
+def messages_info(pluggins, config, msg_info):
+    """ returns help messages of checkers(see lint msg_info) """
+    rezult = []
+    for checker in pluggins.load_checkers():
+        kwargs = {'msg_info': msg_info}
+        kwargs.update(config.get_checker_args(checker.name))
+        rezult += list(checker.check(**kwargs))
+    return rezult
+
+
+def lint_document(target_file, checkers, config, output, parsing=None,
+                  pool=None):
+    """ runs checkers of target file, returns MultiprocessingManager with
+    theirs results. The document is parsed or loaded from layouts cache
+    before checkers are run, so they don't parse it on theirs own """
+    parse = checkers and os.path.isfile(target_file)
+    if parse:
+        prestart_checkers(checkers, config)
+    parsing = parsing or {}
+    selection = None
+    if parse and pool is not None:
+        # parsing and caching document before submitting checkers to
+        # workers
+        selection = selection_option(parsing)
+        load_document(target_file, parsing.get('jobs', 1), selection)
+    # lets run all checkers separately in different processes
+    rezult = checkers_manager(target_file, checkers, config, output,
+                              pool, selection)
+    if parse and pool is None:
+        # parsing document before forking checkers processes
+        parse_document(target_file, parsing, rezult)
+    return rezult
+
+
+def compose_config(config_file, enable_disable_ids, group, pluggins=None):
+    """ loads pluggins(if they aren't given) and composes config with them
+    and command-line options """
+    pluggins = pluggins or PlugginsHandler(group=group)
+    config = LintConfig(config_file)
+    config.compose(pluggins.checkers, *enable_disable_ids)
+    return pluggins, config
+
+
+def enabled_checkers(pluggins, config):
+    """ returns checkers that are enabled by config """
+    return pluggins.load_checkers(
+        categories=config.categories,
+        checkers=config.checkers_ids,
+        disabled_categories=config.disable_categories,
+        disabled_checkers=config.disable_checkers
+    )
+
+
+def checker_args(checker, config):
+    """ returns kwargs of checker: its config args and muted messages ids
+    if checker takes disabled_messages argument, so it may skip muted
+    checks at all """
+    kwargs = dict(config.get_checker_args(checker.name))
+    if config.disable_messages and \
+            takes_argument(checker.check, 'disabled_messages'):
+        kwargs['disabled_messages'] = list(config.disable_messages)
+    return kwargs
+
+
+def prestart_checkers(checkers, config):
+    """ calls prestart hooks of checkers(prestart attribute of checker
+    function) with checkers args, so slow start up of checkers(e.g. of
+    theirs servers) overlaps parsing of the document """
+    for checker in checkers:
+        prestart = getattr(checker.check, 'prestart', None)
+        if prestart is not None:
+            prestart(**checker_args(checker, config))
+
+
+def selection_option(parsing):
+    """ returns (pages, sample_every) pages selection from parsing options """
+    return parsing.get('pages'), parsing.get('sample_every', 1)
+
+
+def parse_document(target_file, parsing, manager):
+    """ parses target file before checkers processes of manager are forked,
+    so all of them share the same document model. Checkers that take
+    pages_text argument aren't waiting for the whole document: they are
+    started in advance and get list of paragraphs per page as soon as the
+    page is parsed. Checkers run by workers pool aren't fed this way. """
+    jobs, selection = parsing.get('jobs', 1), selection_option(parsing)
+    feeds = {}
+    if manager.pool is None:
+        for index, (func, kwargs) in enumerate(manager.poll):
+            if takes_argument(func, 'pages_text'):
+                kwargs['pages_text'] = feeds[index] = Feed()
+    if not feeds:
+        load_document(target_file, jobs, selection)
+        return
+    manager.launch(sorted(feeds))
+    try:
+        for page in stream_pages_text(target_file, jobs, selection):
+            for feed in feeds.values():
+                feed.put(page)
+    except Exception, msg:
+        for feed in feeds.values():
+            feed.close(IOError("The document isn't parsed: %s" % msg))
+        raise
+    for feed in feeds.values():
+        feed.close()
+
+
+def checkers_manager(target_file, checkers, config, output, pool=None,
+                     selection=None):
+    """ returns MultiprocessingManager with checkers of target_file, if
+    pool is given and the document is already parsed with selection(see
+    selection_option) its workers load it from layouts cache, so parsed
+    document isn't passed to each of them """
+    prepare = None
+    if pool is not None and selection is not None:
+        prepare = (load_document, {'path': target_file,
+                                   'selection': selection})
+    rezult = MultiprocessingManager(
+        ordered=not output.get('unordered', False),
+        pool=pool,
+        prepare=prepare)
+    for checker in checkers:
+        kwargs = {'target_file': target_file}
+        kwargs.update(checker_args(checker, config))
+        rezult.append(checker.check, kwargs)
+    return rezult
+
+
+def lint_files(target_files, config_file, output, enable_disable_ids,
+               pool, group="slidelint.pluggins", parsing=None, lookahead=16,
+               composer=None):
+    """ lints many files at once: pluggins and config are loaded only once,
+    files are parsed by pool workers and checkers of all files are run by
+    the same pool as (file, checker) tasks, so workers are never idle while
+    there are files to lint. Reports are written per file in files order.
+
+    It takes the same arguments as lint, besides:
+
+        * target_files - list of paths to pdf files
+        * pool - workers pool(see utils.create_workers_pool)
+        * lookahead - number of files which are parsed and checked in
+                      advance of reported file
+
+    A file that fails to be parsed or checked is reported as failed and
+    the others are linted anyway. It returns list of results per file -
+    raw results if output format is 'raw' or None, the exception is in
+    place of results of failed file. """
+    # pylint: disable=R0913,R0914
+    composer = composer or compose_config
+    pluggins, config = composer(config_file, enable_disable_ids, group)
+    checkers = enabled_checkers(pluggins, config)
+    prestart_checkers(checkers, config)
+    parsing = parsing or {}
+    rezults = []
+    pending = deque()
+    # reports of files with the same names are titled by theirs paths
+    names = Counter(os.path.basename(i) for i in target_files)
+
+    def parsed_selection(result):
+        """ waits for document parsing result, returns pages selection of
+        parsed document or None if it isn't parsed """
+        if result is None:
+            return None
+        result.get()
+        return selection_option(parsing)
+
+    def start_parsed():
+        """ submits to the pool checkers of already parsed files """
+        for index, (path, result, manager) in enumerate(pending):
+            # failed parsing is reported along with the file report
+            if manager is None and (result is None or result.ready() and
+                                    result.successful()):
+                manager = checkers_manager(
+                    path, checkers, config, output, pool,
+                    parsed_selection(result))
+                manager.start()
+                pending[index] = (path, result, manager)
+
+    def report():
+        """ writes report of the oldest pending file """
+        start_parsed()
+        target_file, document_rezult, manager = pending.popleft()
+        try:
+            if manager is None:
+                manager = checkers_manager(
+                    target_file, checkers, config, output, pool,
+                    parsed_selection(document_rezult))
+            rezults.append(output_handler(
+                target_file, manager, config.disable_messages,
+                output['format'], output['files_output'], output['ids'],
+                output.get('stream'),
+                names[os.path.basename(target_file)] > 1))
+        # one broken file mustn't stop linting of the others
+        except Exception, msg:  # pylint: disable=W0703
+            LOGGER.debug("linting of '%s' failed", target_file,
+                         exc_info=True)
+            stream = output.get('stream') or sys.stdout
+            stream.write("slidelint failed to lint %s: %s\n" % (
+                target_file, msg))
+            stream.flush()
+            rezults.append(msg)
+
+    for target_file in target_files:
+        document_rezult = None
+        if checkers and os.path.isfile(target_file):
+            # pages are parsed sequentially, files are parsed in parallel
+            document_rezult = pool.apply_async(
+                cache_document, (target_file, selection_option(parsing)))
+        pending.append((target_file, document_rezult, None))
+        start_parsed()
+        if len(pending) > lookahead:
+            report()
+    while pending:
+        report()
+    return rezults
+
+
+def expand_paths(paths):
+    """ returns list of files to lint: files are taken as is, directories
+    are walked recursively for PDF files """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            files.extend(os.path.join(root, name) for name in sorted(names)
+                         if name.lower().endswith('.pdf'))
+    return files
+
+
+def positive_option(args, name):
+    """ returns value of docopt option that should be positive number,
+    raises ValueError if it isn't """
+    try:
+        value = int(args[name])
+    except (TypeError, ValueError):
+        value = 0
+    if value < 1:
+        raise ValueError("%s should be a positive number, not '%s'" % (
+            name, args[name]))
+    return value
+
+
+def parsing_options(args):
+    """ returns PDF parsing options(see lint) of docopt args, raises
+    ValueError with description of malformed option """
+    if args['--pages']:
+        parse_pages_option(args['--pages'])
+    return {'jobs': positive_option(args, '--jobs'),
+            'pages': args['--pages'],
+            'sample_every': positive_option(args, '--sample-every')}
+
+
+def workers_option(args):
+    """ returns number of pool workers of docopt args or None if it isn't
+    given, raises ValueError if it isn't positive number """
+    if args['--workers'] is None:
+        return None
+    return positive_option(args, '--workers')
+
+
+def exit_status(rezults):
+    """ returns exit status of many files linting(see lint_files) - 1 if
+    some of files failed to lint, 0 otherwise """
+    return int(any(isinstance(i, Exception) for i in rezults))
+
+
+def run(args, pool=None, composer=None, group="slidelint.pluggins",
+        stream=None):
+    """ runs linting as it's asked by docopt parsed command-line args;
+    pool and composer allows to reuse already running workers and loaded
+    pluggins(see lint), report is written to stream(sys.stdout by default);
+    it returns non-zero exit status if some of files failed to lint """
+    target_files = expand_paths(args['PATH'])
     config_file = args['--config']
     output = {'format': args['--output-format'],
               'files_output': args['--files-output'],
-              'ids': args['--include-ids']
+              'ids': args['--include-ids'],
+              'unordered': args['--unordered'],
+              'stream': stream
               }
     enable_disable_ids = (args['--enable'], args['--disable'])
     msg_info = args['<msg_id>'] or "All" if args['help-msg'] else None
-    lint(target_file, config_file, output, enable_disable_ids, msg_info)
+    if not msg_info and not target_files:
+        stream = stream or sys.stderr
+        stream.write("slidelint: no PDF files found in %s\n" % (
+            ", ".join(args['PATH'])))
+        return 1
+    parsing = parsing_options(args)
+    workers = workers_option(args)
+    batch = not msg_info and len(target_files) > 1
+    own_pool = pool is None and (workers or batch)
+    if own_pool:
+        pool = create_workers_pool(workers, PlugginsHandler(group).modules())
+    try:
+        if batch:
+            return exit_status(lint_files(
+                target_files, config_file, output, enable_disable_ids, pool,
+                group=group, parsing=parsing, composer=composer))
+        target_file = target_files[0] if target_files else None
+        lint(target_file, config_file, output, enable_disable_ids,
+             msg_info, group=group, parsing=parsing, pool=pool,
+             composer=composer)
+        return 0
+    finally:
+        if own_pool:
+            pool.terminate()
+
+
+def cli():
+    """
+    User command line interface handler - parses command-line options and
+    run linting
+    """
+    args = docopt(__doc__)
+    try:
+        parsing_options(args)
+        workers = workers_option(args)
+    except ValueError, msg:
+        raise DocoptExit(str(msg))
+    if args['serve'] or args['--client']:
+        # daemon module is built on top of this one
+        from slidelint import daemon
+        if args['serve']:
+            return daemon.serve(args['--socket'], workers)
+        status = daemon.send_request(args, args['--socket'])
+        if status is not None:
+            return status
+    return run(args)
@@ -0,0 +1,163 @@
+""" Long running slidelint daemon and its client. Daemon keeps pluggins
+loaded, configs composed, workers pool warm and LanguageTool server
+attached, and lints files on requests that comes through local unix socket.
+"""
+import os
+import sys
+import json
+import socket
+import signal
+import SocketServer
+from appdirs import user_data_dir
+from slidelint.cli import run, compose_config
+from slidelint.resources import PlugginsHandler
+from slidelint.utils import create_workers_pool
+from slidelint.checkers.language_tool_server import LanguagetoolServer
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+SOCKET_PATH = os.path.join(user_data_dir('slidelint'), 'daemon.sock')
+LANGUAGETOOL = 'language_tool_checker'
+# separates report from exit status in daemon response
+STATUS_MARK = '\0'
+
+
+class Daemon(object):
+    """ Holds everything that is expensive to start: pluggins, composed
+    configs, workers pool and LanguageTool server """
+    def __init__(self, workers=None, group="slidelint.pluggins"):
+        self.group = group
+        self.pluggins = PlugginsHandler(group=group)
+        self.pool = create_workers_pool(workers, self.pluggins.modules())
+        self.configs = {}
+        self.languagetool = self.attach_languagetool()
+
+    def attach_languagetool(self):
+        """ starts LanguageTool server in advance, returns True if it's
+        running """
+        entries = [c.entry_point for c in self.pluggins.checkers
+                   if c.name == LANGUAGETOOL]
+        if not entries:
+            return False
+        checker = sys.modules[entries[0].load().__module__]
+        try:
+            LanguagetoolServer(checker.LT_PATH, keep_alive=True)
+        except (IOError, OSError), msg:
+            LOGGER.error("can't start LanguageTool server: %s", msg)
+            return False
+        return True
+
+    def compose(self, config_file, enable_disable_ids, group):
+        """ returns already loaded pluggins and config composed for the
+        same options, config is reloaded if its file was changed """
+        mtime = config_file and os.path.isfile(config_file) and \
+            os.path.getmtime(config_file)
+        key = (config_file and os.path.abspath(config_file), mtime,
+               enable_disable_ids, group)
+        if key not in self.configs:
+            pluggins = self.pluggins if group == self.group else None
+            if pluggins is None:
+                pluggins = PlugginsHandler(group=group)
+            _, config = compose_config(config_file, enable_disable_ids,
+                                       group, pluggins)
+            if self.languagetool:
+                # attached LanguageTool server must survive checker run
+                args = dict(config.get_checker_args(LANGUAGETOOL),
+                            keep_alive='True')
+                config.checker_args_cache[LANGUAGETOOL] = args
+            self.configs[key] = (pluggins, config)
+        return self.configs[key]
+
+    def lint(self, request, stream):
+        """ handles lint request - docopt args and working directory of
+        client, report is written to stream; returns exit status """
+        os.chdir(request['cwd'])
+        try:
+            # workers of the pool don't follow working directory of client
+            args = absolute_args(request['args'], request['cwd'])
+            return run(args, self.pool, self.compose, self.group, stream)
+        # daemon must survive any failure of a single request
+        except Exception, msg:  # pylint: disable=W0703
+            LOGGER.exception("lint request failed")
+            stream.write("slidelint daemon failed to lint: %s\n" % msg)
+            return 1
+
+    def close(self):
+        """ stops workers pool """
+        self.pool.terminate()
+
+
+def absolute_args(args, cwd):
+    """ returns copy of docopt args with PATH and --config paths made
+    absolute against cwd """
+    args = dict(args)
+    args['PATH'] = [os.path.join(cwd, i) for i in args['PATH']]
+    if args['--config']:
+        args['--config'] = os.path.join(cwd, args['--config'])
+    return args
+
+
+class LintRequestHandler(SocketServer.StreamRequestHandler):
+    """ reads json encoded lint request and streams report back followed
+    by exit status """
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        status = self.server.daemon.lint(request, self.wfile)
+        self.wfile.write("%s%d\n" % (STATUS_MARK, status))
+
+
+def create_server(daemon, path=None):
+    """ returns unix socket server that passes requests to daemon """
+    path = path or SOCKET_PATH
+    socket_dir = os.path.dirname(path)
+    if socket_dir and not os.path.exists(socket_dir):
+        os.makedirs(socket_dir)
+    if os.path.exists(path):
+        # socket of previous daemon that wasn't stopped properly
+        os.remove(path)
+    server = SocketServer.UnixStreamServer(path, LintRequestHandler)
+    server.daemon = daemon
+    return server
+
+
+def serve(path=None, workers=None):
+    """ runs slidelint daemon until it's interrupted """
+    daemon = Daemon(workers)
+    server = create_server(daemon, path)
+    # on termination socket and workers are cleaned up as well
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(server.server_address)
+        daemon.close()
+
+
+def send_request(args, path=None, stream=None):
+    """ sends lint request to daemon and writes its report to stream
+    (sys.stdout by default); returns exit status of linting or None if
+    there is no running daemon """
+    stream = stream or sys.stdout
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path or SOCKET_PATH)
+    except socket.error, msg:
+        LOGGER.debug("can't connect to slidelint daemon: %s", msg)
+        return None
+    status = ''
+    try:
+        request = {'args': args, 'cwd': os.getcwd()}
+        client.sendall(json.dumps(request) + "\n")
+        for chunk in iter(lambda: client.recv(4096), ''):
+            report, mark, rest = (status + chunk).partition(STATUS_MARK)
+            stream.write(report)
+            stream.flush()
+            status = mark + rest
+    finally:
+        client.close()
+    # daemon that died before the end of report leaves no status
+    return int(status[len(STATUS_MARK):]) if status else 1
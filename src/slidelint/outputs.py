@@ -16,15 +16,17 @@ class BaseReporter(object):
     footer = [""]
     formatter = None
 
-    def __init__(self, show_id, mute_ids, path):
+    def __init__(self, show_id, mute_ids, path, unique=False):
         self.show_id = self.only_full_id or show_id
         self.mute_ids = mute_ids
-        self.path = os.path.split(path)[1]
+        self.path = report_title(path, unique)
         self.update_title()
 
     def update_title(self):
-        """ setts title of report """
-        self.header[0] = self.header[0].format(path=self.path)
+        """ setts title of report, header is copied so reporters of
+        different files don't share it """
+        self.header = [self.header[0].format(path=self.path)] + \
+            self.header[1:]
 
     def preformatfix(self, msg):
         """ update result message message data """
@@ -37,12 +39,20 @@ class BaseReporter(object):
         return [self.formatter.format(**msg)
                 for msg in messages]
 
+    def lines(self, report):
+        """ yields report lines, each message is formatted as soon as it
+        comes from report """
+        for line in self.header:
+            yield line
+        for msg in report:
+            if msg['id'] not in self.mute_ids:
+                for line in self.apply_formating([self.preformatfix(msg)]):
+                    yield line
+        for line in self.footer:
+            yield line
+
     def __call__(self, report):
-        filtred = [self.preformatfix(msg)
-                   for msg in report if msg['id'] not in self.mute_ids]
-        fixed_isd = [self.preformatfix(msg) for msg in filtred]
-        rez = self.header + self.apply_formating(fixed_isd) + self.footer
-        return "\n".join(rez) + "\n"
+        return "\n".join(self.lines(report)) + "\n"
 
 
 class TextReporter(BaseReporter):
@@ -91,7 +101,7 @@ class HTMLTextReporter(BaseReporter):
         "</html>"]
 
     def update_title(self):
-        self.header[-1] = self.header[-1] % self.path
+        self.header = self.header[:-1] + [self.header[-1] % self.path]
 
     def apply_formating(self, messages):
         return ['<p>' + self.formatter.format(**msg) + '</p>'
@@ -106,8 +116,27 @@ REPORTERS_MAPING = {
     'html': HTMLTextReporter}
 
 
+def report_file_name(path, unique=False):
+    """ returns name of report file of checked file path, unique name is
+    made of the whole path, so reports of different files with the same
+    names don't overwrite each other """
+    if unique:
+        path = os.path.abspath(path).lstrip(os.sep).replace(os.sep, '_')
+    return os.path.split(path)[1][:-3] + 'lintrez'
+
+
+def report_title(path, unique=False):
+    """ returns name of checked file in its report, unique name is the path
+    relative to the work directory, so reports of different files with the
+    same names are told apart """
+    if unique:
+        return os.path.relpath(path)
+    return os.path.split(path)[1]
+
+
 def output_handler(path, rezults, mute_ids='', output_format='text',
-                   report_file=False, show_id=False):
+                   report_file=False, show_id=False, stream=None,
+                   unique=False):
     """
     Formating check results and handling its output.
     Takes:
@@ -123,9 +152,14 @@ def output_handler(path, rezults, mute_ids='', output_format='text',
         * mute_ids - messages ids to not include in report: ['W1010', 'C2345']
         * report_file - store report to file or to sys.stdout, report file
           will be stored in the work directory with same name as checking
-          target file but with prefix '.lintrez'. Options : True|False
+          target file but with prefix '.lintrez'(see report_file_name), or
+          with the given name. Options : True|False|'name.lintrez'
         * show_id - show or not full message id in report('W' of 'W0101'):
                     True|Fasle
+        * stream - file-like object for report output, sys.stdout by default
+        * unique - name report and its file by path of checking file
+                   instead of its name(see report_title and
+                   report_file_name), for files with the same names
     """
     # raw format for testing purposes or some other level of communication
     if output_format == 'raw':
@@ -136,11 +170,15 @@ def output_handler(path, rezults, mute_ids='', output_format='text',
             output_format,
             REPORTERS_MAPING.keys())
     formater = REPORTERS_MAPING.get(output_format, TextReporter)(
-        show_id, mute_ids, path)
-    formated_report = formater(rezults)
+        show_id, mute_ids, path, unique)
     if report_file:
-        name = os.path.split(path)[1][:-3] + 'lintrez'
+        name = report_file if isinstance(report_file, basestring) else \
+            report_file_name(path, unique)
         with open(name, 'wb') as output_file:
-            output_file.write(formated_report)
+            output_file.write(formater(rezults))
     else:
-        sys.stdout.write(formated_report)
+        # messages are printed as soon as checkers provide them
+        stream = stream or sys.stdout
+        for line in formater.lines(rezults):
+            stream.write(line + "\n")
+            stream.flush()
@@ -1,71 +1,465 @@
 """ utils for working with pdf file"""
-from io import BytesIO
+import os
 from pdfminer.pdfparser import PDFParser, PDFDocument
 from pdfminer.pdfinterp import (
     PDFResourceManager,
     PDFPageInterpreter,
-    process_pdf
 )
-from pdfminer.converter import PDFPageAggregator, TextConverter
-from pdfminer.layout import LAParams, LTChar, LTTextLine, LTTextBox
+from pdfminer.pdftypes import list_value, stream_value
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import (
+    LAParams,
+    LTChar,
+    LTContainer,
+    LTText,
+    LTTextLine,
+    LTTextBox
+)
+import math
+import re
 import string
-from itertools import ifilter, imap
+from multiprocessing import Pool
+from collections import namedtuple
+from hashlib import sha256
+from array import array
+from itertools import ifilter, imap, izip
+from slidelint.cache import FileCache, file_digest
+
+
+def split_into_sentences(line):
+    """cleanup paragraphs"""
+    return ifilter(None, (i.strip() for i in line.split('\n\n')))
 
 
 def split_to_sentences_per_pages(text):
     """ splitting pdfminer outputted text into list of pages and cleanup
     paragraphs"""
-    def split_into_sentences(line):
-        """cleanup paragraphs"""
-        return ifilter(None, (i.strip() for i in line.split('\n\n')))
     return ifilter(None, imap(split_into_sentences, text.split('\x0c')))
 
 
-def convert_pdf_to_text(path):
-    """ converting full PDF document to simple text """
-    rsrcmgr = PDFResourceManager()
-    retstr = BytesIO()
-    codec = 'utf-8'
-    laparams = LAParams()
-    device = TextConverter(rsrcmgr, retstr, codec=codec, laparams=laparams)
-    with open(path, 'rb') as source_file:
-        process_pdf(rsrcmgr, device, source_file)
-    device.close()
-    # returning only printable symbols for simplifying
-    text = "".join(j for j in retstr.getvalue() if j in string.printable)
-    retstr.close()
-    return split_to_sentences_per_pages(text)
+def printable_text(text):
+    """ returning only printable symbols for simplifying """
+    return "".join(j for j in text.encode('utf-8', 'ignore')
+                   if j in string.printable)
 
 
-def layout_characters(layout):
-    """ provides characters information """
-    for item in layout:
+def layout_text(layout):
+    """ renders page layout to text the same way as pdfminer TextConverter
+    does: text boxes are separated by new lines, pages by form feed """
+    def render(item):
+        """ collects text of layout item and its children """
+        if isinstance(item, LTContainer):
+            for child in item:
+                for text in render(child):
+                    yield text
+        elif isinstance(item, LTText):
+            yield item.get_text()
+        if isinstance(item, LTTextBox):
+            yield '\n'
+    return u"".join(render(layout)) + '\f'
+
+
+Character = namedtuple('Character', ['text', 'bbox', 'size', 'fontname'])
+Page = namedtuple('Page', ['width', 'height', 'characters'])
+
+# bump it on any change of parsed document data format
+CACHE_VERSION = '3'
+LAYOUTS_CACHE = FileCache('layouts')
+# text object and external object operators of page content stream
+TEXT_OPERATORS = re.compile(r'(?:^|[\s\)\]>])(?:BT|Do)(?=[\s\(\[<\/]|$)')
+
+
+class CharactersTable(object):
+    """ Columnar storage of page characters: coordinates, sizes, codepoints
+    and fonts are kept in flat arrays, so checks can be done as reductions
+    over columns(min, max, ...) and no per character objects are kept in
+    memory. Characters are grouped into text lines by line_starts offsets.
+    """
+    def __init__(self):
+        self.x0 = array('d')
+        self.y0 = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.size = array('d')
+        self.codepoint = array('L')
+        self.font = array('H')
+        self.fonts = []
+        self.line_starts = array('L')
+
+    def __len__(self):
+        return len(self.codepoint)
+
+    def _font_index(self, fontname):
+        """ returns index of font name in fonts list """
+        try:
+            return self.fonts.index(fontname)
+        except ValueError:
+            self.fonts.append(fontname)
+            return len(self.fonts) - 1
+
+    def append_line(self, characters):
+        """ appends text line - list of LTChar objects """
+        self.line_starts.append(len(self))
+        for item in characters:
+            # pylint: disable=W0212
+            self.x0.append(item.x0)
+            self.y0.append(item.y0)
+            self.x1.append(item.x1)
+            self.y1.append(item.y1)
+            self.size.append(item.size)
+            self.codepoint.append(ord(item._text))
+            self.font.append(self._font_index(item.fontname))
+
+    def row(self, index):
+        """ returns Character object for character with index """
+        return Character(
+            unichr(self.codepoint[index]),
+            (self.x0[index], self.y0[index], self.x1[index], self.y1[index]),
+            self.size[index],
+            self.fonts[self.font[index]])
+
+    def __iter__(self):
+        return imap(self.row, xrange(len(self)))
+
+    def lines(self):
+        """ yields text lines as lists of Character objects """
+        ends = self.line_starts[1:] + array('L', [len(self)])
+        for start, end in izip(self.line_starts, ends):
+            yield [self.row(i) for i in xrange(start, end)]
+
+
+def visible_characters(line):
+    """ yields line characters, no need to yield 'invisible' symbols """
+    for item in line:
         if isinstance(item, LTChar):
-            # no need to yield 'invisible' symbols
             # pylint: disable=W0212
-            if len(item._text) == 1:
-                if ord(item._text) > 32:
-                    yield item
-        elif isinstance(item, LTTextLine):
-            for i in layout_characters(item):
-                yield i
+            if len(item._text) == 1 and ord(item._text) > 32:
+                yield item
+
+
+def layout_lines(layout):
+    """ yields text lines of layout as lists of characters """
+    for item in layout:
+        if isinstance(item, LTTextLine):
+            line = list(visible_characters(item))
+            if line:
+                yield line
         elif isinstance(item, LTTextBox):
-            for i in layout_characters(item):
-                yield i
+            for line in layout_lines(item):
+                yield line
 
 
-def document_pages_layouts(path):
-    """ Basically read pdf document and parce it,
-    yield page number and page layout
-    """
-    parser = PDFParser(open(path, 'rb'))
+def layout_characters_table(layout):
+    """ builds CharactersTable of layout text characters """
+    table = CharactersTable()
+    for line in layout_lines(layout):
+        table.append_line(line)
+    return table
+
+
+def open_pdf_document(source_file):
+    """ returns initialized PDFDocument of opened pdf file """
+    parser = PDFParser(source_file)
     doc = PDFDocument()
     parser.set_document(doc)
     doc.set_parser(parser)
-    rsrcmgr = PDFResourceManager()
+    doc.initialize('')
+    return doc
+
+
+def count_pdf_pages(path):
+    """ returns number of pages in pdf document, pages are not parsed """
+    with open(path, 'rb') as source_file:
+        return sum(1 for _ in open_pdf_document(source_file).get_pages())
+
+
+def may_contain_text(page):
+    """ pre-scans page content streams for text objects and external
+    objects(they can contain text too), page without them has no text
+    for sure, so there is no need to interpret it """
+    try:
+        for stream in list_value(page.contents):
+            if TEXT_OPERATORS.search(stream_value(stream).get_data()):
+                return True
+    # in case of any troubles with streams let interpreter deal with it
+    except Exception:  # pylint: disable=W0703
+        return True
+    return False
+
+
+def parse_pdf_layouts(path, laparams, pages=None, prescan=False):
+    """ Basically read pdf document and parce it,
+    yield page number and page layout; if pages(set of pages numbers)
+    is given only this pages are interpreted; with prescan pages that
+    have no text operators are not interpreted and theirs layout is None
+    """
+    with open(path, 'rb') as source_file:
+        doc = open_pdf_document(source_file)
+        rsrcmgr = PDFResourceManager()
+        device = PDFPageAggregator(rsrcmgr, laparams=laparams)
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for num, page in enumerate(doc.get_pages()):
+            if pages is not None and num not in pages:
+                continue
+            if prescan and not may_contain_text(page):
+                yield num, None
+                continue
+            interpreter.process_page(page)
+            yield num, device.get_result()
+
+
+def iter_parsed_pages(path, laparams, pages=None):
+    """ parses pages of pdf document one by one, yields (num, text, Page)
+    per page """
+    for num, layout in parse_pdf_layouts(path, laparams, pages):
+        yield (num, layout_text(layout),
+               Page(layout.width, layout.height,
+                    layout_characters_table(layout)))
+
+
+def parse_pages(args):
+    """ parses pages of pdf document, returns list of (num, text, Page) per
+    page; it takes (path, laparams, pages) tuple to be usable as pool
+    worker """
+    path, laparams, pages = args
+    return list(iter_parsed_pages(path, laparams, pages))
+
+
+def parse_pages_parallel(path, laparams, jobs, pages=None):
+    """ splits document pages into ranges that are parsed by pool of jobs
+    worker processes, each of them opens document by itself;
+    yields (num, text, Page) in pages order """
+    if pages is None:
+        pages = range(count_pdf_pages(path))
+    # few ranges per worker for balancing pages of different complexity
+    step = max(1, int(math.ceil(len(pages) / (jobs * 4.0))))
+    tasks = [(path, laparams, set(pages[start:start + step]))
+             for start in xrange(0, len(pages), step)]
+    pool = Pool(min(jobs, len(tasks) or 1))
+    try:
+        for parsed in pool.imap(parse_pages, tasks):
+            for page in parsed:
+                yield page
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def parse_pdf(path, laparams, jobs=1, pages=None, parsed=None):
+    """ parses pdf document, returns its printable text and list of
+    (num, Page) pairs; with jobs > 1 pages are parsed in parallel.
+    If pages(sorted list of pages numbers) is given only this pages are
+    parsed, text of others is left empty to keep pages numeration; parsed
+    is (num, text, Page) of already parsed pages, they aren't parsed
+    again """
+    if parsed is not None:
+        pass
+    elif jobs > 1:
+        parsed = parse_pages_parallel(path, laparams, jobs, pages)
+    else:
+        parsed = parse_pages(
+            (path, laparams, None if pages is None else set(pages)))
+    layouts = []
+    raw_text = []
+    for num, page_text, page in parsed:
+        # unselected pages are left empty
+        skipped = num - (layouts[-1][0] + 1 if layouts else 0)
+        raw_text.append('\f' * skipped + page_text)
+        layouts.append((num, page))
+    return printable_text(u"".join(raw_text)), layouts
+
+
+def parse_pages_option(pages):
+    """ parses pages specification alike '1-10,42', returns list of
+    (first, last) pages ranges """
+    ranges = []
+    for item in pages.split(','):
+        bounds = item.strip().split('-')
+        if len(bounds) > 2 or not all(i.strip().isdigit() for i in bounds):
+            raise ValueError("The '%s' in pages specification is malformed, "
+                             "it should be page number or range of pages "
+                             "alike '1-10'" % item)
+        first, last = int(bounds[0]), int(bounds[-1])
+        if first > last:
+            raise ValueError("The '%s' in pages specification is malformed, "
+                             "the first page of range should not be after "
+                             "the last one" % item)
+        ranges.append((first, last))
+    return ranges
+
+
+def select_pages(path, pages=None, sample_every=1):
+    """ returns sorted list of numbers(zero-based) of pages selected by
+    pages specification(alike '1-10,42') and sampling step, or None if
+    all pages are selected """
+    if not pages and sample_every <= 1:
+        return None
+    count = count_pdf_pages(path)
+    if pages:
+        selected = set()
+        for first, last in parse_pages_option(pages):
+            selected.update(xrange(max(first, 1) - 1, min(last, count)))
+        selected = sorted(selected)
+    else:
+        selected = range(count)
+    return selected[::max(sample_every, 1)]
+
+
+def pages_ranges(pages):
+    """ groups sorted pages numbers into (first, last) ranges of
+    consecutive pages """
+    ranges = []
+    for num in pages:
+        if ranges and ranges[-1][1] == num - 1:
+            ranges[-1][1] = num
+        else:
+            ranges.append([num, num])
+    return [tuple(i) for i in ranges]
+
+
+def document_cache_key(path, laparams, pages=None):
+    """ cache key of parsed document - file content hash plus
+    layout analysis parameters and selected pages """
+    params = sorted(vars(laparams).items())
+    return sha256("%s:%s:%r:%r" % (
+        CACHE_VERSION, file_digest(path), params, pages)).hexdigest()
+
+
+class DocumentModel(object):
+    """ Parsed PDF document that is shared between checkers: pdfminer runs
+    over the file only once, pages text is derived from the same layouts.
+    Parsing results are persisted in cache, so unchanged files are not
+    parsed again at all. Pages can be limited by pages specification and
+    sampling step, in this case unselected pages are not interpreted at
+    all, but pages keep theirs absolute numbers. Already parsed pages(see
+    stream_pages_text) are taken as parsed."""
+    def __init__(self, path, cache=LAYOUTS_CACHE, jobs=1, pages=None,
+                 sample_every=1, parsed=None):
+        # pylint: disable=R0913
+        self.path = path
+        self.stamp = file_stamp(path)
+        self.selection = (pages, sample_every)
+        selected = select_pages(path, pages, sample_every)
+        laparams = LAParams()
+        key = document_cache_key(path, laparams, selected)
+        data = cache.get(key) if cache else None
+        if data is None:
+            data = parse_pdf(path, laparams, jobs, selected, parsed)
+            if cache:
+                cache.set(key, data)
+        self.text, self.pages = data
+
+    def pages_text(self):
+        """ yields list of paragraphs per page """
+        return split_to_sentences_per_pages(self.text)
+
+
+def file_stamp(path):
+    """ identifies file state - its real path, size and modification time """
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_size, stat.st_mtime
+
+
+# the last loaded document; checkers processes are forked from the main
+# process, so a document loaded before the fork is shared with all of them
+_LOADED = {}
+
+
+def loaded_document(path):
+    """ returns already loaded DocumentModel of path or None """
+    document = _LOADED.get('document')
+    if document is not None and document.stamp == file_stamp(path):
+        return document
+    return None
+
+
+def share_document(document):
+    """ makes already parsed document loaded one """
+    _LOADED['document'] = document
+
+
+def load_document(path, jobs=1, selection=None):
+    """ returns DocumentModel for path, parsing the file only if it wasn't
+    loaded yet or was changed since then; jobs is number of processes
+    for parsing, selection is (pages, sample_every) pages selection options,
+    if it's omitted the already loaded document is used whatever pages were
+    selected for it """
+    document = loaded_document(path)
+    if document is None or \
+            (selection is not None and document.selection != selection):
+        pages, sample_every = selection or (None, 1)
+        document = _LOADED['document'] = DocumentModel(
+            path, jobs=jobs, pages=pages, sample_every=sample_every)
+    return document
+
+
+def cache_document(path, selection=None):
+    """ loads document(see load_document) in worker process, so it's parsed
+    and cached for the other workers; parsed document isn't returned to not
+    pass it between processes """
+    load_document(path, selection=selection)
+
+
+def iter_pages_text(path):
+    """ yields list of paragraphs per page; if the document isn't loaded
+    pages are parsed one by one, so it's cheap to stop on any page """
+    document = loaded_document(path)
+    if document is not None:
+        for page in document.pages_text():
+            yield list(page)
+        return
+    for _, layout in parse_pdf_layouts(path, LAParams(), prescan=True):
+        if layout is None:
+            yield []
+        else:
+            yield list(split_into_sentences(
+                printable_text(layout_text(layout)).rstrip('\f')))
+
+
+def stream_pages_text(path, jobs=1, selection=None):
+    """ yields list of paragraphs per page as soon as the page is parsed,
+    so the caller works on first pages while the next ones are parsed; the
+    whole document is cached and loaded as by load_document(it takes the
+    same arguments), already loaded or cached document isn't parsed again
+    """
+    pages, sample_every = selection or (None, 1)
+    selected = select_pages(path, pages, sample_every)
     laparams = LAParams()
-    device = PDFPageAggregator(rsrcmgr, laparams=laparams)
-    interpreter = PDFPageInterpreter(rsrcmgr, device)
-    for num, page in enumerate(doc.get_pages()):
-        interpreter.process_page(page)
-        yield num, device.get_result()
+    document = loaded_document(path)
+    if document is not None and \
+            (selection is None or document.selection == selection) or \
+            document_cache_key(path, laparams, selected) in LAYOUTS_CACHE:
+        for page in load_document(path, jobs, selection).pages_text():
+            yield list(page)
+        return
+    if jobs > 1:
+        parsing = parse_pages_parallel(path, laparams, jobs, selected)
+    else:
+        parsing = iter_parsed_pages(
+            path, laparams, None if selected is None else set(selected))
+    parsed = []
+    for num, page_text, page in parsing:
+        # unselected pages are left empty
+        for _ in xrange(num - (parsed[-1][0] + 1 if parsed else 0)):
+            yield []
+        parsed.append((num, page_text, page))
+        yield list(split_into_sentences(
+            printable_text(page_text).rstrip('\f')))
+    share_document(DocumentModel(path, pages=pages,
+                                 sample_every=sample_every, parsed=parsed))
+
+
+def convert_pdf_to_text(path):
+    """ converting full PDF document to simple text """
+    return load_document(path).pages_text()
+
+
+def layout_characters(layout):
+    """ provides characters information """
+    return iter(layout.characters)
+
+
+def document_pages_layouts(path):
+    """ yield page number and page layout(Page object) of pdf document """
+    return iter(load_document(path).pages)
@@ -21,6 +21,10 @@ class PlugginsHandler(object):
                 checkers.append(EntryPoint(name, category, entrie))
         self.checkers = checkers
 
+    def modules(self):
+        """ returns names of modules that provide checkers """
+        return sorted(set(c.entry_point.module_name for c in self.checkers))
+
     def load_checkers(self, categories=('AllCategories',), checkers=(),
                       disabled_categories=(), disabled_checkers=()):
         """
@@ -39,6 +39,12 @@ class TestContentsChecker(unittest.TestCase):
             rez = contents.main(target_file=target_file)
             compare(rez, [])
 
+    def test_pages_text_given(self):
+        compare(contents.main(target_file='missing.pdf',
+                              pages_text=iter([[], ['text'], None])), [])
+        compare(len(contents.main(target_file='missing.pdf',
+                                  pages_text=[[], []])), 1)
+
     def test_checker_helpers(self):
         compare(contents.main(msg_info='All'),
                 [dict(id='W1001',
@@ -6,10 +6,18 @@ The tests check:
   2. whether languagetool finds grammar issues
 """
 import os.path
+import time
+import threading
 import unittest
-from testfixtures import compare, Replacer, tempdir, ShouldRaise
+import requests
+from lxml import etree
+from testfixtures import (compare, Replacer, tempdir, ShouldRaise,
+                          TempDirectory)
 
-from slidelint.checkers import language_tool_checker
+from slidelint.checkers import language_tool_checker, language_tool_server
+from slidelint.tests.checkers.languagetool_grammar import benchmark
+from slidelint.tests.checkers.languagetool_grammar.stand_in_server import \
+    stand_in_command
 
 here = os.path.dirname(os.path.abspath(__file__))
 
@@ -22,10 +30,874 @@ def subprocess_helper(temp_dir, cmd):
         def not_existing_program(*args, **kwargs):
             return origing_popen(cmd, *args[1:], **kwargs)
         r.replace('subprocess.Popen', not_existing_program)
-        language_tool_checker.start_languagetool_server(
+        language_tool_server.start_languagetool_server(
             temp_dir.path, config_file)
 
 
+def fake_grammar_checker(words):
+    """ returns grammar checker that finds given words, as Language Tool
+    server does, and list of checked texts """
+    checked = []
+
+    def grammar_checker(text, language='en-US', parameters=None):
+        checked.append(text)
+        errors = []
+        for word in words:
+            offset = text.find(word)
+            if offset != -1:
+                errors.append(etree.Element(
+                    'error', ruleId='TEST', offset=str(offset),
+                    errorlength=str(len(word)), context=text))
+        return sorted(errors, key=lambda e: int(e.get('offset')))
+    return grammar_checker, checked
+
+
+class TestBatching(unittest.TestCase):
+
+    pages = [['First  paragraph', 'second\nparagraph'],
+             [],
+             ['third paragraph']]
+
+    def test_paragraphs_batches(self):
+        paragraphs = list(language_tool_checker.pages_paragraphs(self.pages))
+        compare(paragraphs, [(0, 'First paragraph'), (0, 'second paragraph'),
+                             (2, 'third paragraph')])
+
+        def batches(size_limit, per_page=False):
+            return language_tool_checker.paragraphs_batches(
+                iter(paragraphs), size_limit, per_page)
+        compare(list(batches(10000)),
+                [[(0, 'First paragraph'), (0, 'second paragraph'),
+                  (2, 'third paragraph')]])
+        compare(list(batches(10000, per_page=True)),
+                [[(0, 'First paragraph'), (0, 'second paragraph')],
+                 [(2, 'third paragraph')]])
+        compare(list(batches(0)),
+                [[(0, 'First paragraph')], [(0, 'second paragraph')],
+                 [(2, 'third paragraph')]])
+        compare(list(batches(35)),
+                [[(0, 'First paragraph'), (0, 'second paragraph')],
+                 [(2, 'third paragraph')]])
+
+    def test_unique_paragraphs(self):
+        paragraphs = [(0, 'Title'), (0, 'a honour'), (1, 'Title'),
+                      (1, 'other'), (2, 'a honour')]
+        compare(language_tool_checker.unique_paragraphs(paragraphs),
+                [(0, 'Title'), (0, 'a honour'), (1, 'other')])
+
+    def test_repeated_paragraphs_checked_once(self):
+        grammar_checker, checked = fake_grammar_checker(['honour'])
+
+        class Server(FakeLanguagetoolServer):
+            """ records checked texts """
+            started = []
+
+            def __init__(self, *args):
+                super(Server, self).__init__(*args)
+                self.grammar_checker = grammar_checker
+
+        pages = [['Footer is a honour', 'one'], ['two'],
+                 ['Footer is a honour']]
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', Server)
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', lambda path: pages)
+            rez = language_tool_checker.main(target_file='deck.pdf',
+                                             cache='False')
+        compare(checked, ['Footer is a honour\n\none\n\ntwo'])
+        compare([(i['page'], i['help']) for i in rez],
+                [('Slide 1', 'Footer is a honour'),
+                 ('Slide 3', 'Footer is a honour')])
+
+    def test_pages_in_background(self):
+        extracted = []
+
+        def pages():
+            for num in range(10):
+                extracted.append(num)
+                yield [str(num)]
+        stream = language_tool_checker.pages_in_background(pages(), 2)
+        compare(next(stream), ['0'])
+        time.sleep(0.1)
+        # only queue size pages are extracted in advance
+        compare(extracted, [0, 1, 2, 3])
+        compare(list(stream), [[str(i)] for i in range(1, 10)])
+
+        def broken_pages():
+            yield ['0']
+            raise ValueError('broken page')
+        stream = language_tool_checker.pages_in_background(broken_pages())
+        compare(next(stream), ['0'])
+        with ShouldRaise(ValueError('broken page')):
+            next(stream)
+
+    def test_pages_checked_while_parsed(self):
+        grammar_checker, checked = fake_grammar_checker(['honour'])
+        first_checked = threading.Event()
+
+        class Server(FakeLanguagetoolServer):
+            """ signals the first check """
+            started = []
+
+            def __init__(self, *args):
+                super(Server, self).__init__(*args)
+
+                def signalling_checker(*args, **kwargs):
+                    first_checked.set()
+                    return grammar_checker(*args, **kwargs)
+                self.grammar_checker = signalling_checker
+
+        def pages(path):
+            # batch is sent when the next paragraph is taken
+            yield ['It is a honour.', 'Title']
+            # would block until the timeout if pages were checked after
+            # the whole document is parsed
+            first_checked.wait(5)
+            compare(first_checked.is_set(), True)
+            yield ['Another honour.']
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', Server)
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', pages)
+            for max_concurrency in ('1', '4'):
+                first_checked.clear()
+                rez = language_tool_checker.main(
+                    target_file='deck.pdf', cache='False', batch='paragraph',
+                    max_concurrency=max_concurrency)
+                compare([(i['page'], i['help']) for i in rez],
+                        [('Slide 1', 'It is a honour.'),
+                         ('Slide 2', 'Another honour.')])
+            # pages that slidelint gives while it parses the document are
+            # checked the same way
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', None)
+            first_checked.clear()
+            rez = language_tool_checker.main(
+                target_file='deck.pdf', cache='False', batch='paragraph',
+                max_concurrency='4', pages_text=pages('deck.pdf'))
+            compare([(i['page'], i['help']) for i in rez],
+                    [('Slide 1', 'It is a honour.'),
+                     ('Slide 2', 'Another honour.')])
+        compare(len(checked), 9)
+
+    def test_split_text(self):
+        split_text = language_tool_checker.split_text
+        compare(split_text('First one.\n\nSecond. Third one.', 16),
+                [(0, 'First one.\n\n'), (12, 'Second. '),
+                 (20, 'Third one.')])
+        compare(split_text('Words without sentences end', 10),
+                [(0, 'Words '), (6, 'without '), (14, 'sentences '),
+                 (24, 'end')])
+        compare(split_text('Unsplittable', 5),
+                [(0, 'Unspl'), (5, 'ittab'), (10, 'le')])
+        compare(split_text('Short', 5), [(0, 'Short')])
+
+    def test_check_text(self):
+        grammar_checker, checked = fake_grammar_checker(['alot'])
+        text = 'I know alot. ' * 4
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'MIN_CHUNK_SIZE', 10)
+            # long text is checked by parts
+            errors = language_tool_checker.check_text(grammar_checker, text,
+                                                      15)
+            compare([offset for offset, _ in errors], [7, 20, 33, 46])
+            compare(len(checked), 4)
+
+            # failed text is split in halves
+            def failing_checker(text, language='en-US'):
+                if len(text) > 20:
+                    raise requests.exceptions.Timeout()
+                return grammar_checker(text, language)
+            errors = language_tool_checker.check_text(failing_checker, text)
+            compare([offset for offset, _ in errors], [7, 20, 33, 46])
+
+            # failure of the smallest text is raised
+            def broken_checker(text, language='en-US'):
+                raise requests.exceptions.ConnectionError()
+            with ShouldRaise(requests.exceptions.ConnectionError):
+                language_tool_checker.check_text(broken_checker, text)
+
+    def test_check_batch(self):
+        grammar_checker, checked = fake_grammar_checker(
+            ['First', 'second', 'third'])
+        batch = [(0, 'First paragraph'), (0, 'second paragraph'),
+                 (2, 'third paragraph')]
+        rez = language_tool_checker.check_batch(grammar_checker, batch)
+        compare(checked,
+                ['First paragraph\n\nsecond paragraph\n\nthird paragraph'])
+        compare([[(error['ruleId'], error['offset'], context)
+                  for error, context in errors] for errors in rez],
+                [[('TEST', '0', 'First paragraph')],
+                 [('TEST', '17', 'second paragraph')],
+                 [('TEST', '35', 'third paragraph')]])
+
+    def test_check_batches(self):
+        grammar_checker, checked = fake_grammar_checker(
+            ['First', 'second', 'third'])
+        in_flight = []
+        lock = threading.Lock()
+
+        def slow_grammar_checker(text, language='en-US'):
+            with lock:
+                in_flight.append(text)
+            # the first request is the slowest one
+            time.sleep(0.3 if 'First' in text else 0.05)
+            return grammar_checker(text)
+        batches = [[(0, 'First paragraph')], [(0, 'second paragraph')],
+                   [(2, 'third paragraph')]]
+        rez = [(num, text, len(errors)) for num, text, errors in
+               language_tool_checker.check_batches(
+                   slow_grammar_checker, iter(batches), 3)]
+        compare(rez, [(0, 'First paragraph', 1), (0, 'second paragraph', 1),
+                      (2, 'third paragraph', 1)])
+        # all requests were sent before the first one was done
+        compare(checked[-1], 'First paragraph')
+        compare(len(in_flight), 3)
+
+    def test_error_offset(self):
+        text = 'First paragraph\n\nsecond paragraph'
+        compare(language_tool_checker.error_offset(
+            etree.Element('error', fromy='2', fromx='7'), text), 24)
+        compare(language_tool_checker.error_offset(
+            etree.Element('error', fromy='2', fromx='7', offset='24'),
+            text), 24)
+
+    def test_error_context(self):
+        text = ("Ask whether they're coats in the cloakroom. I know alot "
+                "about precious stones. Have you seen them yet?")
+        compare(language_tool_checker.error_context(text, 51, 4),
+                "... they're coats in the cloakroom. I know alot about "
+                "precious stones. Have you seen th...")
+        compare(language_tool_checker.error_context('I know alot.', 7, 4),
+                'I know alot.')
+
+
+class FakeLanguagetoolServer(object):
+    """ stands for LanguagetoolServer, finds 'honour' words """
+    started = []
+
+    def __init__(self, *args):
+        self.started.append(args)
+        self.grammar_checker = fake_grammar_checker(['honour'])[0]
+        self.url = 'http://127.0.0.1:%s' % len(self.started)
+        self.restarted = []
+        self.is_alive = True
+        self.restarting = None
+
+    def alive(self):
+        return self.is_alive
+
+    def available(self):
+        # dead server stays being restarted
+        if self.restarting is None and not self.is_alive:
+            self.restarted.append(self.url)
+            self.restarting = self.url
+        return self.restarting is None
+
+    def __enter__(self):
+        return self.grammar_checker
+
+    def __exit__(self, *args):
+        pass
+
+
+class TestGrammarCache(unittest.TestCase):
+
+    @tempdir()
+    def test_cached_paragraphs_are_not_checked(self, temp_dir):
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', FakeLanguagetoolServer)
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'languagetool_version', lambda path: '2.2')
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'GRAMMAR_CACHE.path',
+                      os.path.join(temp_dir.path, 'grammar.sqlite'))
+            FakeLanguagetoolServer.started = []
+            rez = language_tool_checker.main(target_file=target_file)
+            compare([(i['page'], i['help']) for i in rez],
+                    [('Slide 1', 'It would be a honour.')])
+            compare(len(FakeLanguagetoolServer.started), 1)
+            # the server isn't even started when all paragraphs are cached
+            compare(language_tool_checker.main(target_file=target_file,
+                                               prestart='False'), rez)
+            compare(len(FakeLanguagetoolServer.started), 1)
+            # results of other Language Tool version aren't used
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'languagetool_version', lambda path: '2.3')
+            compare(language_tool_checker.main(target_file=target_file), rez)
+            compare(len(FakeLanguagetoolServer.started), 2)
+
+
+class TestRules(unittest.TestCase):
+
+    # double whitespace is left of the triple one after clean up
+    pages = [['the deck , has   slides', 'It would be a honour.']]
+
+    def main(self, rules):
+        """ returns (page, message id, message name) of checker results """
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', lambda path: self.pages)
+            rez = language_tool_checker.main(target_file='deck.pdf',
+                                             cache='False', rules=rules)
+        return [(i['page'], i['id'], i['msg_name']) for i in rez]
+
+    def test_mechanical_rules_checked_in_process(self):
+        def no_server(*args):
+            raise AssertionError("Language Tool server is started")
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', no_server)
+            compare(self.main('C2004, COMMA_PARENTHESIS_WHITESPACE'),
+                    [('Slide 1', 'C2001', 'COMMA_PARENTHESIS_WHITESPACE'),
+                     ('Slide 1', 'C2004', 'WHITESPACE_RULE')])
+
+    def test_other_rules_checked_by_server(self):
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', FakeLanguagetoolServer)
+            # fake server reports 'TEST' rule as other rules(C2000)
+            compare(self.main('C2000,C2004'),
+                    [('Slide 1', 'C2000', 'TEST')])
+            compare(self.main('MORFOLOGIK_RULE_EN_US'), [])
+            compare(self.main('all'), [('Slide 1', 'C2000', 'TEST')])
+
+    def test_rules_parameters(self):
+        rules_parameters = language_tool_checker.rules_parameters
+        compare(rules_parameters(None, set()), {})
+        compare(rules_parameters(None, set(['MORFOLOGIK_RULE_EN_US'])),
+                {'disabled': 'MORFOLOGIK_RULE_EN_US'})
+        # reported rules and other rules
+        parameters = rules_parameters(
+            set(['language-tool', 'WHITESPACE_RULE']), set())
+        self.assertTrue('WHITESPACE_RULE' not in
+                        parameters['disabled'].split(','))
+        self.assertTrue('MORFOLOGIK_RULE_EN_US' in
+                        parameters['disabled'].split(','))
+        compare(rules_parameters(set(['EN_A_VS_AN', 'WHITESPACE_RULE']),
+                                 set(['C2004', 'WHITESPACE_RULE'])),
+                {'enabled': 'EN_A_VS_AN', 'enabledOnly': 'yes'})
+        # other rules are turned off by enabling only known ones
+        parameters = rules_parameters(None, set(['language-tool']))
+        compare(parameters['enabledOnly'], 'yes')
+        self.assertTrue('MORFOLOGIK_RULE_EN_US' in
+                        parameters['enabled'].split(','))
+
+    def test_disabled_messages(self):
+        def no_server(*args):
+            raise AssertionError("Language Tool server is started")
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', lambda path: self.pages)
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', no_server)
+            # the rest of reported rules is checked in process
+            rez = language_tool_checker.main(
+                target_file='deck.pdf', cache='False',
+                rules='C2001,C2004,MORFOLOGIK_RULE_EN_US',
+                disabled_messages=['C2005', 'C2001'])
+        compare([(i['id'], i['msg_name']) for i in rez],
+                [('C2004', 'WHITESPACE_RULE')])
+
+    def test_selected_rules(self):
+        selected_rules = language_tool_checker.selected_rules
+        compare(selected_rules('All'), None)
+        compare(selected_rules('C2004,\nMORFOLOGIK_RULE_EN_US, '),
+                set(['WHITESPACE_RULE', 'MORFOLOGIK_RULE_EN_US']))
+
+
+class TestPrestart(unittest.TestCase):
+
+    def test_server_starts_while_document_is_parsed(self):
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        parsing = threading.Event()
+        stream_pages_text = language_tool_checker.stream_pages_text
+
+        class SlowServer(FakeLanguagetoolServer):
+            """ starts only when the document parsing is begun """
+            stopped = []
+
+            def __init__(self, *args):
+                # would block forever if the server were started first
+                parsing.wait(5)
+                compare(parsing.is_set(), True)
+                super(SlowServer, self).__init__(*args)
+
+            def __exit__(self, *args):
+                self.stopped.append(self.url)
+
+        def slow_parsing(path):
+            parsing.set()
+            return stream_pages_text(path)
+
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', SlowServer)
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'stream_pages_text', slow_parsing)
+            SlowServer.started = []
+            rez = language_tool_checker.main(target_file=target_file,
+                                             cache='False')
+            compare([(i['page'], i['help']) for i in rez],
+                    [('Slide 1', 'It would be a honour.')])
+            compare(len(SlowServer.started), 1)
+            compare(len(SlowServer.stopped), 1)
+
+    def test_not_needed_servers_not_waited(self):
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        booted = threading.Event()
+        stopped = threading.Event()
+
+        class BootingServer(FakeLanguagetoolServer):
+            """ starts only when it's allowed to """
+            def __init__(self, *args):
+                booted.wait(5)
+                super(BootingServer, self).__init__(*args)
+
+            def __exit__(self, *args):
+                stopped.set()
+
+        with Replacer() as r:
+            r.replace('slidelint.checkers.language_tool_server.'
+                      'LanguagetoolServer', BootingServer)
+            r.replace('slidelint.checkers.language_tool_checker.'
+                      'pages_paragraphs', lambda pages, start=0: [])
+            compare(language_tool_checker.main(target_file=target_file,
+                                               cache='False'), [])
+            # the checker is done before the server is started
+            compare(stopped.is_set(), False)
+            booted.set()
+            # not needed server is stopped as soon as it's started
+            stopped.wait(5)
+            compare(stopped.is_set(), True)
+
+
+class TestStandInServer(unittest.TestCase):
+    """ real servers handling against pure-Python stand-in server """
+
+    def setUp(self):
+        self.temp_dir = TempDirectory()
+        self.replacer = Replacer()
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.user_data_dir',
+            lambda *args: self.temp_dir.path)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.BACKOFF', 0.01)
+
+    def stand_in(self, **options):
+        """ makes checker start stand-in servers with options """
+        options.setdefault('misspelled', ['alot', 'honour'])
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.server_command',
+            stand_in_command(**options))
+
+    def tearDown(self):
+        self.replacer.restore()
+        self.temp_dir.cleanup()
+
+    def test_language_tool_checker(self):
+        self.stand_in()
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        rez = language_tool_checker.main(target_file=target_file,
+                                         cache='False')
+        compare([(i['page'], i['id'], i['help']) for i in rez],
+                [('Slide 1', 'C2005', 'It would be a honour.'),
+                 ('Slide 3', 'C2005',
+                  '... they\'re coats in the cloakroom. I know alot about '
+                  'precious stones. Have you seen th...')])
+
+    def test_prestarted_servers_reused(self):
+        self.stand_in()
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        checker = language_tool_checker
+        server = language_tool_server
+        starters = checker.main.prestart(servers='2', cache='False')
+        compare(len(starters), 2)
+        compare([starter.daemon for starter in starters], [True, True])
+        for starter in starters:
+            starter.join()
+        pids = [server.read_registry(server.registry_file(i))['pid']
+                for i in range(2)]
+        rez = checker.main(target_file=target_file, cache='False',
+                           servers='2')
+        compare(len(rez), 2)
+        # the checker took prestarted servers and stopped them
+        compare([server.read_registry(server.registry_file(i))['pid']
+                 for i in range(2)], pids)
+        for _ in range(100):
+            if not any(server.process_running(pid) for pid in pids):
+                break
+            time.sleep(0.01)
+        compare([server.process_running(pid) for pid in pids],
+                [False, False])
+        # servers aren't needed for mechanical rules
+        compare(checker.main.prestart(rules='C2001,C2004'), [])
+        compare(checker.main.prestart(prestart='False'), [])
+
+    def test_cache_used_by_concurrent_checks(self):
+        received = os.path.join(self.temp_dir.path, 'received')
+        self.stand_in(received=received)
+        self.replacer.replace('slidelint.checkers.language_tool_checker.'
+                              'languagetool_version', lambda path: '2.2')
+        self.replacer.replace('slidelint.checkers.language_tool_checker.'
+                              'GRAMMAR_CACHE.path',
+                              os.path.join(self.temp_dir.path, 'grammar'))
+        pages = [['I know alot.'], ['It would be a honour.'],
+                 ['The deck has slides.', 'Have a nice day.']]
+        self.replacer.replace('slidelint.checkers.language_tool_checker.'
+                              'stream_pages_text', lambda path: iter(pages))
+
+        def received_paragraphs():
+            """ number of paragraphs the server has got """
+            with open(received) as texts:
+                return len(texts.readlines())
+        rez = language_tool_checker.main(
+            target_file='deck.pdf', batch='paragraph', max_concurrency='4')
+        compare(received_paragraphs(), 4)
+        # paragraphs of the next pages are taken from cache by checking
+        # thread, while the new one of the first page is checked
+        pages[0] = ['I know it.']
+        compare(language_tool_checker.main(
+            target_file='deck.pdf', batch='paragraph', max_concurrency='4'),
+            rez[1:])
+        compare(received_paragraphs(), 5)
+
+    def test_killed_server_restarted(self):
+        self.stand_in()
+        pool = language_tool_server.LanguagetoolServersPool('lt_path')
+        with pool as grammar_checker:
+            pid = pool.servers[0].pid
+            os.kill(pid, 9)
+            # killed but not reaped process isn't running
+            for _ in range(100):
+                if not pool.servers[0].alive():
+                    break
+                time.sleep(0.01)
+            compare(pool.servers[0].alive(), False)
+            compare([e.get('ruleId') for e in grammar_checker('I know alot')],
+                    ['MORFOLOGIK_RULE_EN_US'])
+            self.assertNotEqual(pool.servers[0].pid, pid)
+            # the registry of killed server isn't used
+            compare(language_tool_server.LanguagetoolServer('lt_path').pid,
+                    pool.servers[0].pid)
+
+    def test_retries(self):
+        # failures of the seed: x.x..xx.xx, the longest run is 2 requests
+        self.stand_in(error_rate=0.5, seed=3)
+        with language_tool_server.LanguagetoolServer(
+                'lt_path') as grammar_checker:
+            for _ in range(5):
+                compare(len(grammar_checker('I know alot')), 1)
+
+    def test_failed_server_restarted_in_background(self):
+        self.stand_in(error_rate=1)
+        server = language_tool_server.LanguagetoolServer('lt_path')
+        pid = server.pid
+        with server as grammar_checker:
+            with ShouldRaise():
+                grammar_checker('I know alot')
+            # server failed RESTART_AFTER times in a row
+            restarting = server.restarting
+            self.assertTrue(restarting is not None)
+            restarting.join()
+            self.assertNotEqual(server.pid, pid)
+            compare(server.failures, 0)
+
+    def test_frozen_server_restarted(self):
+        self.stand_in(freeze_after=1)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.MIN_TIMEOUT', 0.2)
+        server = language_tool_server.LanguagetoolServer('lt_path')
+        with server as grammar_checker:
+            compare(len(grammar_checker('I know alot')), 1)
+            # timeout adapts to observed speed of the server
+            self.assertTrue(server.timeout('I know alot') < 1)
+            pid = server.pid
+            for _ in range(language_tool_server.RESTART_AFTER):
+                with ShouldRaise():
+                    grammar_checker('I know alot')
+            # request waits for restarted server
+            compare(len(grammar_checker('I know alot')), 1)
+            self.assertNotEqual(server.pid, pid)
+
+    def test_pathological_text_split(self):
+        self.stand_in(max_text=150)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.TIMEOUT', 0.3)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.MIN_TIMEOUT', 0.3)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_checker.MIN_CHUNK_SIZE', 50)
+        text = ' '.join(['I know alot about stones.'] * 16)
+        with language_tool_server.LanguagetoolServer(
+                'lt_path') as grammar_checker:
+            errors = language_tool_checker.check_text(grammar_checker, text)
+        compare([offset for offset, _ in errors],
+                [i * 26 + 7 for i in range(16)])
+
+    def test_disabled_rules_skipped_by_server(self):
+        self.stand_in()
+        target_file = os.path.join(here, 'languagetool_grammar.pdf')
+        rez = language_tool_checker.main(
+            target_file=target_file, cache='False',
+            disabled_messages=['C2005'])
+        compare(rez, [])
+
+    def test_benchmark(self):
+        self.stand_in()
+        start, speed = benchmark.throughput(benchmark.sample_paragraphs(20),
+                                            max_concurrency=2)
+        self.assertTrue(start > 0 and speed > 0)
+
+    def launched(self, dumping=True):
+        """ makes checker start stand-in servers, returns list of started
+        servers JVM options; AppCDS classes are dumped if dumping is True """
+        self.stand_in()
+        server_command = language_tool_server.server_command
+        launched = []
+
+        def command(lt_path, port, jvm_options=(), server_options=()):
+            launched.append(jvm_options)
+            if not dumping:
+                jvm_options = [i for i in jvm_options
+                               if 'ArchiveClassesAtExit' not in i]
+            return server_command(lt_path, port, jvm_options, server_options)
+        self.replacer.replace(
+            'slidelint.checkers.language_tool_server.server_command',
+            command)
+        return launched
+
+    def test_cds_archive(self):
+        launched = self.launched()
+        archive = os.path.join(self.temp_dir.path, 'lt.jsa')
+        settings = language_tool_server.server_settings(
+            'lt_path', cds=archive)
+        server = language_tool_server.LanguagetoolServer(
+            'lt_path', settings=settings)
+        with server as grammar_checker:
+            compare(len(grammar_checker('I know alot')), 1)
+            # archive is built by separate server before the first start
+            compare(self.temp_dir.read('lt.jsa'), 'stand-in classes')
+            compare(len(launched), 2)
+            self.assertTrue(launched[0][-1].startswith(
+                '-XX:ArchiveClassesAtExit=%s.' % archive))
+            compare(launched[1][-1], '-XX:SharedArchiveFile=%s' % archive)
+            # the archive is reused by restarted server
+            server.restart()
+            compare(launched[2:],
+                    [language_tool_server.JVM_OPTIONS +
+                     ['-XX:SharedArchiveFile=%s' % archive]])
+        compare(sorted(os.listdir(self.temp_dir.path)),
+                ['lt.jsa', 'run', 'run.lock', 'run.log'])
+
+    def test_cds_unsupported(self):
+        launched = self.launched(dumping=False)
+        settings = language_tool_server.server_settings(
+            'lt_path', cds=os.path.join(self.temp_dir.path, 'lt.jsa'))
+        server = language_tool_server.LanguagetoolServer(
+            'lt_path', settings=settings)
+        with server:
+            # JVM that can't dump classes leaves empty archive, so it isn't
+            # built again and it isn't used
+            compare(self.temp_dir.read('lt.jsa'), '')
+            server.restart()
+            compare(launched[1:], [language_tool_server.JVM_OPTIONS] * 2)
+
+
+class TestServerSettings(unittest.TestCase):
+
+    @tempdir()
+    def test_launch_options(self, temp_dir):
+        config_file = os.path.join(temp_dir.path, 'run')
+        settings = language_tool_server.server_settings(
+            'lt_path', heap='512m', collector='Serial', threads='4')
+        compare(language_tool_server.launch_options(config_file, settings),
+                (['-XX:+IgnoreUnrecognizedVMOptions', '-Xmx512m',
+                  '-XX:+UseSerialGC'],
+                 ['--config', config_file + '.properties']))
+        compare(temp_dir.read('run.properties'), 'maxCheckThreads=4\n')
+        # JVM and Language Tool defaults are used by default
+        compare(language_tool_server.launch_options(
+            config_file, language_tool_server.server_settings('lt_path')),
+            (['-XX:+IgnoreUnrecognizedVMOptions'], []))
+        compare(language_tool_server.server_command(
+            'lt', '8081', ['-Xmx1g'], ['--config', 'lt.properties']),
+            ['java', '-Xmx1g', '-cp', os.path.join('lt', 'languagetool-'
+                                                    'server.jar'),
+             'org.languagetool.server.HTTPServer', '--port', '8081',
+             '--config', 'lt.properties'])
+
+    def test_server_settings(self):
+        server_settings = language_tool_server.server_settings
+        with ShouldRaise(ValueError(
+                "gc should be one of g1, parallel, serial, shenandoah, z")):
+            server_settings('lt_path', collector='CMS')
+        # there is no archive of missed Language Tool jar
+        compare(server_settings('lt_path', cds='True')['archive'], None)
+        compare(server_settings('lt_path', cds='~/lt.jsa')['archive'],
+                os.path.expanduser('~/lt.jsa'))
+
+
+class TestSession(unittest.TestCase):
+
+    def test_get_session(self):
+        get_session = language_tool_server.get_session
+        session = get_session('http://127.0.0.1:1')
+        self.assertTrue(session is get_session('http://127.0.0.1:1'))
+        self.assertTrue(session is not get_session('http://127.0.0.1:2'))
+        # session of restarted server is closed
+        language_tool_server.close_session('http://127.0.0.1:1')
+        self.assertTrue(session is not get_session('http://127.0.0.1:1'))
+
+
+class TestServersPool(unittest.TestCase):
+
+    def setUp(self):
+        self.replacer = Replacer()
+        self.replacer.replace('slidelint.checkers.language_tool_server.'
+                              'LanguagetoolServer', FakeLanguagetoolServer)
+        FakeLanguagetoolServer.started = []
+
+    def tearDown(self):
+        self.replacer.restore()
+
+    def test_least_loaded_dispatch(self):
+        pool = language_tool_server.LanguagetoolServersPool(
+            'lt_path', 3, False, 4)
+        compare(sorted(i[3] for i in FakeLanguagetoolServer.started),
+                [0, 1, 2])
+        compare(sorted(pool.acquire() for _ in range(3)), [0, 1, 2])
+        pool.loads = [2, 0, 1]
+        compare(pool.acquire(), 1)
+        compare(pool.loads, [2, 1, 1])
+
+    def test_dead_server_restarted(self):
+        pool = language_tool_server.LanguagetoolServersPool(
+            'lt_path', 2, False, 4)
+        pool.loads = [1, 0]
+        pool.servers[1].is_alive = False
+
+        def dead_checker(*args):
+            self.fail("request is sent to dead server")
+        pool.servers[1].grammar_checker = dead_checker
+        with pool as grammar_checker:
+            # the least loaded server is dead, so the other one checks
+            # while it's restarted in background
+            compare(len(grammar_checker('a honour')), 1)
+            compare(len(grammar_checker('a honour')), 1)
+        compare(pool.servers[1].restarted, [pool.servers[1].url])
+        compare(pool.servers[0].restarted, [])
+        compare(pool.loads, [1, 0])
+        # requests wait for the least loaded server if all of them are
+        # restarted
+        pool.servers[0].restarting = pool.servers[0].url
+        compare(pool.acquire(), 1)
+
+
+class TestServerRegistry(unittest.TestCase):
+
+    @tempdir()
+    def test_only_one_server_is_started(self, temp_dir):
+        import subprocess
+        origing_popen = subprocess.Popen
+        started = []
+        cmd = ['python', '-c', 'import sys, time; print "Server started"; '
+               'sys.stdout.flush(); time.sleep(30)']
+
+        def server(*args, **kwargs):
+            time.sleep(0.2)
+            started.append(origing_popen(cmd, *args[1:], **kwargs))
+            return started[-1]
+        config_file = os.path.join(temp_dir.path, 'run')
+        servers = []
+        with Replacer() as r:
+            r.replace('subprocess.Popen', server)
+            threads = [threading.Thread(
+                target=lambda: servers.append(
+                    language_tool_server.get_languagetool_port_and_pid(
+                        temp_dir.path, config_file)))
+                for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        try:
+            compare(len(started), 1)
+            compare(set(servers), set([servers[0]]))
+            entry = language_tool_server.read_registry(config_file)
+            compare((str(entry['port']), entry['pid']), servers[0])
+            compare(entry['version'], None)
+            self.assertTrue(entry['started'] <= time.time())
+        finally:
+            for process in started:
+                process.kill()
+
+    @tempdir()
+    def test_previous_registry_format(self, temp_dir):
+        config_file = temp_dir.write('run', '8081,%s' % os.getpid())
+        compare(language_tool_server.read_registry(config_file),
+                {'port': '8081', 'pid': str(os.getpid())})
+        compare(language_tool_server.registered_server(
+            temp_dir.path, config_file), ('8081', os.getpid()))
+
+
+class TestServerLog(unittest.TestCase):
+
+    @tempdir()
+    def test_output_after_start_is_logged(self, temp_dir):
+        # server that writes more than pipe buffer can hold after its start
+        # must not block on its output
+        marker = os.path.join(temp_dir.path, 'done')
+        subprocess_helper(
+            temp_dir,
+            ['python', '-c', 'import sys; print "Server started"; '
+             'sys.stdout.flush(); sys.stdout.write("x" * 10 ** 6); '
+             'sys.stdout.flush(); open(%r, "w").close()' % marker])
+        deadline = time.time() + 10
+        while not os.path.exists(marker) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(os.path.exists(marker))
+        log = language_tool_server.server_log(
+            os.path.join(temp_dir.path, 'tmp_file'))
+        self.assertTrue(os.path.getsize(log) > 10 ** 6)
+
+    @tempdir()
+    def test_failure_output_in_error(self, temp_dir):
+        subprocess_helper(temp_dir, ['python', '-c', 'print "first run"'
+                                     '; print "Server started"'])
+        try:
+            subprocess_helper(temp_dir, ['python', '-c', 'print "no java"'])
+        except IOError, msg:
+            self.assertIn('no java', str(msg))
+            # only output of failed run is reported
+            self.assertNotIn('first run', str(msg))
+        else:
+            self.fail("IOError wasn't raised")
+
+    @tempdir()
+    def test_rotate_log(self, temp_dir):
+        log = temp_dir.write('run.log', 'a' * 10)
+        language_tool_server.rotate_log(log, size_limit=10, backups=2)
+        compare(temp_dir.read('run.log'), 'a' * 10)
+        for content in 'bcd':
+            with open(log, 'a') as stream:
+                stream.write(content * 11)
+            language_tool_server.rotate_log(log, size_limit=10, backups=2)
+        compare(temp_dir.read('run.log'), '')
+        compare(temp_dir.read('run.log.1'), 'd' * 11)
+        compare(temp_dir.read('run.log.2'), 'c' * 11)
+        compare(sorted(os.listdir(temp_dir.path)),
+                ['run.log', 'run.log.1', 'run.log.2'])
+        # there is nothing to rotate
+        language_tool_server.rotate_log(
+            os.path.join(temp_dir.path, 'no.log'))
+
+
 class Test_Languagetool_Checker(unittest.TestCase):
 
     @tempdir()
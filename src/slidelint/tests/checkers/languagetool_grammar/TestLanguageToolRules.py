@@ -0,0 +1,57 @@
+"""
+Pure-Python mechanical Language Tool rules.
+
+The tests check:
+  1. whether each rule finds its errors and skips correct text
+  2. whether errors are reported as Language Tool server reports them
+"""
+import unittest
+from testfixtures import compare
+
+from slidelint.checkers import language_tool_rules
+
+
+def found(rule, text):
+    """ returns texts of errors found by rule """
+    return [text[offset:offset + length]
+            for offset, length, _, _ in rule(text)]
+
+
+class TestLanguageToolRules(unittest.TestCase):
+
+    def test_whitespace_rule(self):
+        rule = language_tool_rules.whitespace_rule
+        compare(found(rule, 'The  deck has   slides'), ['  ', '   '])
+        compare(found(rule, 'The deck (  has ) slides  .'), [])
+
+    def test_comma_parenthesis_whitespace(self):
+        rule = language_tool_rules.comma_parenthesis_whitespace
+        compare(found(rule, 'One , two,three ( four ) 1,000'),
+                [' ,', ',', '( ', ' )'])
+
+    def test_uppercase_sentence_start(self):
+        rule = language_tool_rules.uppercase_sentence_start
+        compare(found(rule, 'the deck. and more! but why? yes'),
+                ['the', 'and', 'but', 'yes'])
+        compare(found(rule, 'Use e.g. this or B.B.C. news... really.\n\n'
+                            'next slide. iPhone and x86 are fine.'),
+                ['next'])
+
+    def test_whitespace_punctuation(self):
+        rule = language_tool_rules.whitespace_punctuation
+        compare(found(rule, 'Really ? Yes ! No ; so : end .'),
+                [' ?', ' !', ' ;', ' :', ' .'])
+        compare(found(rule, 'It is .5 of .NET ... :) fine.'), [])
+
+    def test_rules_checker(self):
+        text = 'the deck , has  slides .'
+        with language_tool_rules.RulesChecker() as grammar_checker:
+            compare([(e.get('ruleId'), e.get('offset'), e.get('errorlength'))
+                     for e in grammar_checker(text)],
+                    [('UPPERCASE_SENTENCE_START', '0', '3'),
+                     ('COMMA_PARENTHESIS_WHITESPACE', '8', '2'),
+                     ('WHITESPACE_RULE', '14', '2'),
+                     ('WHITESPACE_PUNCTUATION', '22', '2')])
+        checker = language_tool_rules.RulesChecker(['WHITESPACE_RULE'])
+        compare([e.get('ruleId') for e in checker.grammar_checker(text)],
+                ['WHITESPACE_RULE'])
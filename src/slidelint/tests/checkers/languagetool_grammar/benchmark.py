@@ -0,0 +1,126 @@
+""" Throughput benchmark of language tool checker. Paragraphs are checked by
+stand-in Language Tool servers(see stand_in_server), so it doesn't need Java
+and it can be used to tune batching and pooling options anywhere; it reports
+paragraphs per second for each batch, max_concurrency and servers options
+and how fast killed server is restarted.
+
+Usage:
+  benchmark.py [options]
+
+Options:
+  --paragraphs=<n>          number of checked paragraphs [default: 400]
+  --latency=<seconds>       stand-in server delay of each response
+                            [default: 0.02]
+  --char-latency=<seconds>  stand-in server delay per checked character
+                            [default: 0.00002]
+  --threads=<n>             number of requests one server processes at once
+                            [default: 2]
+  --startup=<seconds>       stand-in server start delay [default: 0.5]
+  --error-rate=<rate>       part of failed requests [default: 0]
+  --batch=<names>           comma separated batch options
+                            [default: paragraph,page,document]
+  --batch-size=<n>          max size of batch in characters [default: 2000]
+  --concurrency=<values>    comma separated max_concurrency options
+                            [default: 1,4,8]
+  --servers=<values>        comma separated servers options [default: 1,2]
+"""
+import os
+import time
+from contextlib import contextmanager
+from docopt import docopt
+from testfixtures import Replacer, TempDirectory
+from slidelint.checkers import language_tool_checker, language_tool_server
+from slidelint.tests.checkers.languagetool_grammar.stand_in_server import \
+    stand_in_command
+
+SENTENCES = (
+    "Quarterly revenue grew faster than we expected.",
+    "I know alot about our customers.",
+    "The  new release ships next month.",
+    "Confidential, do not distribute.",
+    "Questions?")
+
+
+def sample_paragraphs(count, per_page=5):
+    """ returns (page number, paragraph) pairs of synthetic slides """
+    return [(num // per_page, "%s %s" % (
+        SENTENCES[num % len(SENTENCES)], num)) for num in range(count)]
+
+
+@contextmanager
+def stand_in_servers(**options):
+    """ makes language_tool_checker start stand-in servers with options,
+    servers registry is kept in temporary directory """
+    with TempDirectory() as temp_dir:
+        with Replacer() as replacer:
+            replacer.replace('slidelint.checkers.language_tool_server.'
+                             'server_command', stand_in_command(**options))
+            replacer.replace('slidelint.checkers.language_tool_server.'
+                             'user_data_dir', lambda *args: temp_dir.path)
+            yield
+
+
+def throughput(paragraphs, batch='document', batch_size=2000,
+               max_concurrency=4, servers=1):
+    """ returns (servers start seconds, checked paragraphs per second) """
+    size_limit = 0 if batch == 'paragraph' else batch_size
+    started = time.time()
+    pool = language_tool_server.LanguagetoolServersPool(
+        language_tool_checker.LT_PATH, servers, False, max_concurrency)
+    checking = time.time()
+    with pool as grammar_checker:
+        batches = language_tool_checker.paragraphs_batches(
+            paragraphs, size_limit, batch == 'page')
+        for _ in language_tool_checker.check_batches(
+                grammar_checker, batches, max_concurrency):
+            pass
+    return checking - started, len(paragraphs) / (time.time() - checking)
+
+
+def restart_time():
+    """ returns (restart seconds, seconds of first check after the server
+    was killed) """
+    pool = language_tool_server.LanguagetoolServersPool(
+        language_tool_checker.LT_PATH)
+    with pool as grammar_checker:
+        server = pool.servers[0]
+        started = time.time()
+        server.restart()
+        restart = time.time() - started
+        os.kill(server.pid, 9)
+        started = time.time()
+        grammar_checker("I know alot.")
+        return restart, time.time() - started
+
+
+def main(argv=None):
+    """ runs benchmark and prints its results """
+    args = docopt(__doc__, argv=argv)
+    paragraphs = sample_paragraphs(int(args['--paragraphs']))
+    options = dict(latency=args['--latency'],
+                   char_latency=args['--char-latency'],
+                   threads=args['--threads'],
+                   startup=args['--startup'],
+                   error_rate=args['--error-rate'])
+    print "%-10s %-12s %-8s %-10s %s" % (
+        'batch', 'concurrency', 'servers', 'start, s', 'paragraphs/s')
+    with stand_in_servers(**options):
+        for batch in args['--batch'].split(','):
+            for concurrency in args['--concurrency'].split(','):
+                for servers in args['--servers'].split(','):
+                    row = "%-10s %-12s %-8s" % (batch, concurrency, servers)
+                    try:
+                        start, speed = throughput(
+                            paragraphs, batch, int(args['--batch-size']),
+                            int(concurrency), int(servers))
+                    # failures that retries and splitting didn't help with
+                    except Exception, msg:  # pylint: disable=W0703
+                        print "%s failed: %s" % (row, msg)
+                        continue
+                    print "%s %-10.2f %.1f" % (row, start, speed)
+        restart, recovery = restart_time()
+    print "restart: %.2f s, check after kill: %.2f s" % (restart, recovery)
+
+
+if __name__ == '__main__':
+    main()
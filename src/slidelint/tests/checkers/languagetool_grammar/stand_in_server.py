@@ -0,0 +1,231 @@
+""" Pure-Python stand-in for Language Tool HTTP server. It speaks the same
+XML protocol as Language Tool server, but it finds only repeated whitespaces
+and given misspelled words. Latency, server capacity, failures and freezes
+are configurable, so language tool checker can be tested and benchmarked
+without Java (see stand_in_command and benchmark module). As JVM with AppCDS
+classes dumping it writes dump file on graceful shut down.
+
+Usage:
+  stand_in_server.py --port=<port> [options]
+
+Options:
+  --startup=<seconds>       delay of server start [default: 0]
+  --latency=<seconds>       delay of each response [default: 0]
+  --char-latency=<seconds>  extra delay of response per checked character
+                            [default: 0]
+  --threads=<n>             number of requests processed at once, the others
+                            wait for theirs turn [default: 10]
+  --error-rate=<rate>       part of requests answered by HTTP 500 error
+                            [default: 0]
+  --freeze-after=<n>        stop answering after n requests, 0 for never
+                            [default: 0]
+  --max-text=<n>            texts longer than n characters are never
+                            answered, as pathological ones, 0 for no limit
+                            [default: 0]
+  --misspelled=<words>      comma separated words reported as spelling
+                            mistakes [default: alot]
+  --seed=<seed>             seed of failures injection [default: 0]
+  --dump=<path>             file that is written when server is terminated
+  --received=<path>         file where texts of requests are appended to,
+                            one JSON string per line
+"""
+import os
+import re
+import sys
+import json
+import signal
+import time
+import random
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+from docopt import docopt
+from lxml import etree
+
+CONTEXT_SIZE = 40
+OPTIONS = ('startup', 'latency', 'char_latency', 'threads', 'error_rate',
+           'freeze_after', 'max_text', 'misspelled', 'seed', 'received')
+
+
+def text_position(text, offset):
+    """ returns (line, column) of offset in text """
+    line = text.count('\n', 0, offset)
+    return line, offset - text.rfind('\n', 0, offset) - 1
+
+
+def find_errors(text, misspelled):
+    """ yields (offset, length, rule id, message, issue type) of errors
+    found in text """
+    for match in re.finditer(r'  +', text):
+        yield (match.start(), len(match.group()), 'WHITESPACE_RULE',
+               'Possible typo: you repeated a whitespace', 'whitespace')
+    if misspelled:
+        words = r'\b(%s)\b' % '|'.join(re.escape(i) for i in misspelled)
+        for match in re.finditer(words, text, re.I):
+            yield (match.start(), len(match.group()), 'MORFOLOGIK_RULE_EN_US',
+                   'Possible spelling mistake found', 'misspelling')
+
+
+def matches_xml(text, language, misspelled, enabled=None, disabled=()):
+    """ returns Language Tool server response with errors of text, only
+    enabled(all if it's None) and not disabled rules are checked """
+    matches = etree.Element('matches', software='LanguageTool',
+                            version='stand-in')
+    etree.SubElement(matches, 'language', shortname=language)
+    for offset, length, rule_id, msg, issue in sorted(
+            find_errors(text, misspelled)):
+        if rule_id in disabled or (enabled is not None and
+                                   rule_id not in enabled):
+            continue
+        fromy, fromx = text_position(text, offset)
+        toy, tox = text_position(text, offset + length)
+        start = max(0, offset - CONTEXT_SIZE)
+        end = offset + length + CONTEXT_SIZE
+        context = ('...' if start else '') + \
+            text[start:end].replace('\n', ' ') + \
+            ('...' if end < len(text) else '')
+        etree.SubElement(
+            matches, 'error',
+            fromy=str(fromy), fromx=str(fromx), toy=str(toy), tox=str(tox),
+            ruleId=rule_id, msg=msg, replacements='', context=context,
+            contextoffset=str(offset - start + (3 if start else 0)),
+            offset=str(offset), errorlength=str(length), category='Stand-in',
+            locqualityissuetype=issue)
+    return etree.tostring(matches, xml_declaration=True, encoding='UTF-8')
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ handles check requests as Language Tool server does """
+    # connections are kept alive as they are by Language Tool server
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):  # pylint: disable=C0103
+        """ checks posted text """
+        server = self.server
+        length = int(self.headers.getheader('content-length', 0))
+        form = urlparse.parse_qs(self.rfile.read(length),
+                                 keep_blank_values=True)
+        text = form.get('text', [''])[0].decode('utf-8')
+        language = form.get('language', ['en-US'])[0]
+        disabled = form.get('disabled', [''])[0].split(',')
+        enabled = None
+        if form.get('enabledOnly', [''])[0] == 'yes':
+            enabled = form.get('enabled', [''])[0].split(',')
+        number, chance = server.next_request(text)
+        if (server.freeze_after and number > server.freeze_after) or \
+                (server.max_text and len(text) > server.max_text):
+            # frozen server doesn't answer until it's killed
+            threading.Event().wait()
+        with server.capacity:
+            time.sleep(server.latency + server.char_latency * len(text))
+        if chance < server.error_rate:
+            self.respond(500, 'text/plain', 'Error: injected failure')
+        else:
+            self.respond(200, 'text/xml', matches_xml(
+                text, language, server.misspelled, enabled, disabled))
+
+    def respond(self, code, content_type, body):
+        """ sends response with body """
+        self.send_response(code)
+        self.send_header('Content-Type', '%s; charset=UTF-8' % content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ threaded http server with stand-in options """
+    daemon_threads = True
+
+    # pylint: disable=R0913
+    def __init__(self, port, latency=0, char_latency=0, threads=10,
+                 error_rate=0, freeze_after=0, max_text=0,
+                 misspelled=('alot',), seed=0, received=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', int(port)),
+                                           StandInHandler)
+        self.latency = latency
+        self.char_latency = char_latency
+        self.capacity = threading.Semaphore(threads)
+        self.error_rate = error_rate
+        self.freeze_after = freeze_after
+        self.max_text = max_text
+        self.misspelled = misspelled
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.received = received
+        self.lock = threading.Lock()
+
+    def next_request(self, text):
+        """ returns number of new request with text and its failure chance
+        """
+        with self.lock:
+            self.requests += 1
+            if self.received:
+                with open(self.received, 'a') as received:
+                    received.write(json.dumps(text) + '\n')
+            return self.requests, self.random.random()
+
+
+def stand_in_command(**options):
+    """ returns function that replaces language_tool_server.server_command,
+    so stand-in server with given options(see OPTIONS) is started instead of
+    Language Tool one """
+    script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+    args = []
+    for name, value in sorted(options.items()):
+        if name not in OPTIONS:
+            raise TypeError("unknown stand-in server option %s" % name)
+        if name == 'misspelled':
+            value = ','.join(value)
+        args.append('--%s=%s' % (name.replace('_', '-'), value))
+
+    # pylint: disable=W0613
+    def server_command(lt_path, port, jvm_options=(), server_options=()):
+        """ command of stand-in server, AppCDS classes dumping is the only
+        JVM option it takes """
+        dump = [i.replace('-XX:ArchiveClassesAtExit=', '--dump=')
+                for i in jvm_options
+                if i.startswith('-XX:ArchiveClassesAtExit=')]
+        return [sys.executable, script, '--port=%s' % port] + args + dump
+    return server_command
+
+
+def dump_at_exit(path):
+    """ makes server write dump file to path and exit when it's terminated """
+    def terminate(*args):  # pylint: disable=W0613
+        """ writes dump file and exits """
+        with open(path, 'w') as dump:
+            dump.write('stand-in classes')
+        os._exit(0)  # pylint: disable=W0212
+    signal.signal(signal.SIGTERM, terminate)
+
+
+def main(argv=None):
+    """ runs stand-in server until it's killed """
+    args = docopt(__doc__, argv=argv)
+    if args['--dump']:
+        dump_at_exit(args['--dump'])
+    time.sleep(float(args['--startup']))
+    server = StandInServer(
+        args['--port'],
+        latency=float(args['--latency']),
+        char_latency=float(args['--char-latency']),
+        threads=int(args['--threads']),
+        error_rate=float(args['--error-rate']),
+        freeze_after=int(args['--freeze-after']),
+        max_text=int(args['--max-text']),
+        misspelled=[i for i in args['--misspelled'].split(',') if i],
+        seed=int(args['--seed']),
+        received=args['--received'])
+    # the same message Language Tool server prints when it's ready
+    print "Server started"
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -25,9 +25,12 @@ The tests check:
 """
 import os.path
 import unittest
-from testfixtures import compare, ShouldRaise, tempdir, Replacer
+from testfixtures import (compare, ShouldRaise, tempdir, Replacer,
+                          TempDirectory)
+from PIL import Image
 
 from slidelint.checkers import readability
+from slidelint.pdf_utils import load_document
 
 here = os.path.dirname(os.path.abspath(__file__))
 
@@ -63,6 +66,33 @@ class TestContentsChecker(unittest.TestCase):
                 ['python', '-c',
                  'import signal; import sys; sys.exit(signal.SIGSEGV)'])
 
+    def test_sampled_pages_rendered_at_once(self):
+        target_file = os.path.join(here, 'msoffice_redability.pdf')
+        calls = []
+
+        def tranform2html(source, dist, first=None, last=None):
+            calls.append((first, last))
+            # only images of selected pages exist, others must be skipped
+            images = [os.path.join(dist, 'out%03d.png' % num)
+                      for num in range(first, last + 1)]
+            for num in (1, 4, 7, 10):
+                Image.new('RGB', (10, 10)).save(images[num - first])
+            pages = '<div></div>' * (last - first + 1)
+            return '<html><body>%s</body></html>' % pages, images
+        with TempDirectory() as temp_dir:
+            with Replacer() as replacer:
+                replacer.replace('slidelint.pdf_utils._LOADED', {})
+                replacer.replace('slidelint.pdf_utils.LAYOUTS_CACHE.path',
+                                 temp_dir.path)
+                replacer.replace(
+                    'slidelint.checkers.readability.tranform2html',
+                    tranform2html)
+                load_document(target_file, selection=(None, 3))
+                pages = [num for num, _ in
+                         readability.goes_throught_pages(target_file)]
+        compare(pages, [0, 3, 6, 9])
+        compare(calls, [(1, 10)])
+
     def test_custom_args(self):
         # for prefix in ('msoffice', ):
         # for prefix in ('libreoffice', ):
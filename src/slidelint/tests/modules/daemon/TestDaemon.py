@@ -0,0 +1,78 @@
+import os
+import unittest
+import threading
+from StringIO import StringIO
+from docopt import docopt
+from testfixtures import TempDirectory, compare
+from slidelint import cli
+from slidelint.daemon import Daemon, create_server, send_request
+
+here = os.path.dirname(os.path.abspath(__file__))
+config = os.path.join(os.path.dirname(here), 'linter', 'test_models.cfg')
+presentation = os.path.join(os.path.dirname(os.path.dirname(here)),
+                            'checkers', 'font_size',
+                            'libreoffice_font_gradient.pdf')
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempDirectory()
+        self.socket = os.path.join(self.tmp.path, 'daemon.sock')
+        self.daemon = Daemon(workers=2, group="slidelint.tests")
+        self.server = create_server(self.daemon, self.socket)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.daemon.close()
+        self.tmp.cleanup()
+
+    def lint(self, *argv, **kwargs):
+        args = docopt(cli.__doc__, argv=list(argv))
+        output = StringIO()
+        compare(send_request(args, self.socket, output),
+                kwargs.get('status', 0))
+        return output.getvalue()
+
+    def test_lint_request(self):
+        expected = (
+            "********************** Slide Deck presentation.pdf\n"
+            "C:1: warning message with id C2011 (critical-C2011)\n"
+            "C:2: warning message with id C1011 arg1 is \"10\"; "
+            "arg2 is \"20\" (critical-C1011)\n\n")
+        compare(self.lint('--config=%s' % config, 'presentation.pdf'),
+                expected)
+        # pluggins and config are loaded only once
+        compare(self.lint('--config=%s' % config, 'presentation.pdf'),
+                expected)
+        compare(len(self.daemon.configs), 1)
+
+    def test_relative_paths(self):
+        # workers of the daemon don't share working directory of client
+        work_dir = os.getcwd()
+        with open(presentation, 'rb') as source:
+            self.tmp.write(('decks', 'deck.pdf'), source.read())
+        self.tmp.write('test_models.cfg', open(config).read())
+        try:
+            os.chdir(self.tmp.path)
+            compare(self.lint('--config=test_models.cfg', 'decks/deck.pdf'),
+                    "********************** Slide Deck deck.pdf\n"
+                    "C:1: warning message with id C2011 (critical-C2011)\n"
+                    "C:2: warning message with id C1011 arg1 is \"10\"; "
+                    "arg2 is \"20\" (critical-C1011)\n\n")
+        finally:
+            os.chdir(work_dir)
+
+    def test_exit_status(self):
+        empty = self.tmp.makedir('empty')
+        compare(self.lint('--config=%s' % config, empty, status=1),
+                "slidelint: no PDF files found in %s\n" % empty)
+
+    def test_no_daemon(self):
+        args = docopt(cli.__doc__, argv=['presentation.pdf'])
+        compare(send_request(args, os.path.join(self.tmp.path, 'no.sock')),
+                None)
@@ -1,12 +1,28 @@
 import os.path
 import unittest
-from testfixtures import OutputCapture, compare, ShouldRaise
+from docopt import docopt, DocoptExit
+from testfixtures import (OutputCapture, TempDirectory, compare, ShouldRaise,
+                          Replacer)
 
-from slidelint.cli import lint
-from slidelint.utils import MultiprocessingManager
-from slidelint.tests.modules.linter.test_modules import exeption_raising_func
+from slidelint import cli
+from slidelint.cli import (lint, lint_files, expand_paths, compose_config,
+                           checkers_manager, parsing_options, parse_document,
+                           workers_option)
+from slidelint.pdf_utils import loaded_document, load_document
+from slidelint.resources import Checker
+from slidelint.utils import (MultiprocessingManager, create_workers_pool,
+                             help_wrapper, takes_argument)
+from slidelint.tests.modules.linter.test_modules import (
+    exeption_raising_func,
+    sleeping_func,
+    pages_text_cheker,
+    loaded_pages_cheker
+)
 
 here = os.path.dirname(os.path.abspath(__file__))
+presentation = os.path.join(os.path.dirname(os.path.dirname(here)),
+                            'checkers', 'font_size',
+                            'libreoffice_font_gradient.pdf')
 
 
 class TestMultiprocessingManager(unittest.TestCase):
@@ -38,6 +54,33 @@ class TestMultiprocessingManager(unittest.TestCase):
         mltprsm.append(exeption_raising_func, {'arg': 4.0})
         compare([1.0, 0.5, 0.25], [i for i in mltprsm])
 
+    def test_rezult_order(self):
+        mltprsm = MultiprocessingManager()
+        mltprsm.append(sleeping_func, {'delay': 0.5, 'value': 'slow'})
+        mltprsm.append(sleeping_func, {'delay': 0, 'value': 'fast'})
+        compare(['slow', 'fast'], [i for i in mltprsm])
+        mltprsm.ordered = False
+        compare(['fast', 'slow'], [i for i in mltprsm])
+
+    def test_workers_pool(self):
+        pool = create_workers_pool(2, ['slidelint.tests.modules.linter'])
+        try:
+            mltprsm = MultiprocessingManager(pool=pool)
+            mltprsm.append(sleeping_func, {'delay': 0.5, 'value': 'slow'})
+            mltprsm.append(exeption_raising_func, {'arg': 2.0})
+            compare(['slow', 0.5], [i for i in mltprsm])
+            # the same workers are reused for the next run
+            mltprsm = MultiprocessingManager(pool=pool)
+            mltprsm.append(exeption_raising_func, {'arg': 0})
+            exp = IOError(
+                "The function 'exeption_raising_func' of "
+                "'slidelint.tests.modules.linter.test_modules' module"
+                " raised an Exception:\ninteger division or modulo by zero")
+            with ShouldRaise(exp):
+                [i for i in mltprsm]
+        finally:
+            pool.terminate()
+
 
 class TestLinterRunner(unittest.TestCase):
     def setUp(self):
@@ -112,5 +155,304 @@ class TestLinterRunner(unittest.TestCase):
                   msg='warning message with id C1011 arg1 is '
                       '"10"; arg2 is "20"', page='2')])
 
+    def test_many_files_check(self):
+        pool = create_workers_pool(2)
+        try:
+            del self.kwargs['target_file'], self.kwargs['msg_info']
+            results = [list(i) for i in lint_files(
+                ['presentation.pdf', 'other.pdf'], pool=pool,
+                lookahead=1, **self.kwargs)]
+            self.kwargs['output']['format'] = 'text'
+            with OutputCapture() as output:
+                lint_files(['presentation.pdf', 'other.pdf'], pool=pool,
+                           **self.kwargs)
+        finally:
+            pool.terminate()
+        file_results = [
+            dict(id='C2011', msg_name='critical-C2011',
+                 msg='warning message with id C2011', page='1'),
+            dict(id='C1011', msg_name='critical-C1011',
+                 msg='warning message with id C1011 arg1 is '
+                     '"10"; arg2 is "20"', page='2')]
+        compare(results, [file_results, file_results])
+        output.compare(
+            "********************** Slide Deck presentation.pdf\n"
+            "C2011:1: warning message with id C2011 (critical-C2011)\n"
+            "C1011:2: warning message with id C1011 arg1 is \"10\"; "
+            "arg2 is \"20\" (critical-C1011)\n\n"
+            "********************** Slide Deck other.pdf\n"
+            "C2011:1: warning message with id C2011 (critical-C2011)\n"
+            "C1011:2: warning message with id C1011 arg1 is \"10\"; "
+            "arg2 is \"20\" (critical-C1011)\n")
+
+    def test_broken_file_reported(self):
+        pool = create_workers_pool(2)
+        try:
+            del self.kwargs['target_file'], self.kwargs['msg_info']
+            self.kwargs['output']['format'] = 'text'
+            with TempDirectory() as tmp:
+                broken = tmp.write('broken.pdf', 'not a pdf')
+                with OutputCapture() as output:
+                    results = lint_files([broken, 'presentation.pdf'],
+                                         pool=pool, **self.kwargs)
+                args = docopt(cli.__doc__, argv=[
+                    '--config', self.kwargs['config_file'], broken,
+                    'presentation.pdf'])
+                with OutputCapture():
+                    compare(cli.run(args, pool, group="slidelint.tests"), 1)
+        finally:
+            pool.terminate()
+        self.assertTrue(isinstance(results[0], Exception))
+        compare(results[1:], [None])
+        self.assertTrue(output.captured.startswith(
+            "slidelint failed to lint %s: " % broken))
+        self.assertTrue(output.captured.endswith(
+            "********************** Slide Deck presentation.pdf\n"
+            "C2011:1: warning message with id C2011 (critical-C2011)\n"
+            "C1011:2: warning message with id C1011 arg1 is \"10\"; "
+            "arg2 is \"20\" (critical-C1011)\n\n"))
+
+    def test_same_names_reports(self):
+        pool = create_workers_pool(2)
+        work_dir = os.getcwd()
+        try:
+            del self.kwargs['target_file'], self.kwargs['msg_info']
+            self.kwargs['output'].update(format='text', files_output=True)
+            with TempDirectory() as tmp:
+                os.chdir(tmp.path)
+                lint_files(['a/presentation.pdf', 'b/presentation.pdf',
+                            'other.pdf'], pool=pool, **self.kwargs)
+                path = os.getcwd().lstrip(os.sep).replace(os.sep, '_')
+                compare(sorted(os.listdir(tmp.path)),
+                        sorted([path + '_a_presentation.lintrez',
+                                path + '_b_presentation.lintrez',
+                                'other.lintrez']))
+                self.kwargs['output']['files_output'] = False
+                with OutputCapture() as output:
+                    lint_files(['a/presentation.pdf', 'b/presentation.pdf',
+                                'other.pdf'], pool=pool, **self.kwargs)
+                headers = [line for line in output.captured.splitlines()
+                           if line.startswith('*')]
+                compare(headers,
+                        ["********************** Slide Deck "
+                         "a/presentation.pdf",
+                         "********************** Slide Deck "
+                         "b/presentation.pdf",
+                         "********************** Slide Deck other.pdf"])
+        finally:
+            os.chdir(work_dir)
+            pool.terminate()
+
+
+class TestParseDocument(unittest.TestCase):
+    def setUp(self):
+        _, self.config = compose_config(None, ('', ''), "slidelint.tests")
+        self.checkers = [
+            Checker('pages_text_cheker', 'Test', pages_text_cheker),
+            Checker('plain_checker', 'Test', plain_checker)]
+        self.temp_dir = TempDirectory()
+        self.replacer = Replacer()
+        self.replacer.replace('slidelint.pdf_utils._LOADED', {})
+        self.replacer.replace('slidelint.pdf_utils.LAYOUTS_CACHE.path',
+                              self.temp_dir.path)
+
+    def tearDown(self):
+        self.replacer.restore()
+        self.temp_dir.cleanup()
+
+    def test_pages_text_fed_while_parsed(self):
+        manager = checkers_manager(presentation, self.checkers, self.config,
+                                   {})
+        launched = []
+        self.replacer.replace(
+            'slidelint.utils.MultiprocessingManager.launch',
+            lambda self, indexes: launched.append(
+                (indexes, loaded_document(presentation))))
+        parse_document(presentation, {'pages': '2-5'}, manager)
+        # only the checker that takes pages text is started before
+        # document is parsed
+        compare(launched, [([0], None)])
+        self.assertTrue(loaded_document(presentation) is not None)
+        compare(list(manager.poll[0][1]['pages_text']),
+                [[], ['1/2'], ['1/3'], ['1/4'], ['1/5']])
+
+    def test_pages_text_checker_run(self):
+        manager = checkers_manager(presentation, self.checkers, self.config,
+                                   {})
+        parse_document(presentation, {}, manager)
+        compare(list(manager), [dict(id='P0001', page='16')])
+
+    def test_workers_load_cached_document(self):
+        selection = ('2-5', 1)
+        load_document(presentation, 1, selection)
+        # workers can't parse document, so they take it from cache
+        self.replacer.replace('slidelint.pdf_utils.parse_pdf', None)
+        pool = create_workers_pool(2)
+        try:
+            checkers = [Checker('loaded_pages_cheker', 'Test',
+                                loaded_pages_cheker)] * 3
+            manager = checkers_manager(presentation, checkers, self.config,
+                                       {}, pool, selection)
+            compare(manager.prepare,
+                    (load_document, {'path': presentation,
+                                     'selection': selection}))
+            compare(list(manager), [dict(id='P0002', page='4')] * 3)
+        finally:
+            pool.terminate()
+
+
+class TestExpandPaths(unittest.TestCase):
+    def test_expand_paths(self):
+        with TempDirectory() as tmp:
+            tmp.write('b.pdf', '')
+            tmp.write('a/c.PDF', '')
+            tmp.write('a/d/e.pdf', '')
+            tmp.write('a/notes.txt', '')
+            compare(
+                expand_paths(['x.pdf', tmp.path]),
+                ['x.pdf',
+                 os.path.join(tmp.path, 'b.pdf'),
+                 os.path.join(tmp.path, 'a', 'c.PDF'),
+                 os.path.join(tmp.path, 'a', 'd', 'e.pdf')])
+
+    def test_no_files_found(self):
+        with TempDirectory() as tmp:
+            tmp.write('notes.txt', '')
+            tmp.makedir('empty')
+            args = docopt(cli.__doc__, argv=[tmp.path,
+                                             os.path.join(tmp.path, 'empty')])
+            with OutputCapture() as output:
+                compare(cli.run(args, group="slidelint.tests"), 1)
+            output.compare("slidelint: no PDF files found in %s, %s" % (
+                tmp.path, os.path.join(tmp.path, 'empty')))
+
+
+class TestOptions(unittest.TestCase):
+    def parsing(self, *argv):
+        return parsing_options(docopt(cli.__doc__,
+                                      argv=list(argv) + ['deck.pdf']))
+
+    def test_parsing_options(self):
+        compare(self.parsing('--jobs=4', '--sample-every=2'),
+                {'jobs': 4, 'pages': None, 'sample_every': 2})
+        compare(self.parsing(),
+                {'jobs': 1, 'pages': None, 'sample_every': 1})
+        with ShouldRaise(ValueError(
+                "--jobs should be a positive number, not 'x'")):
+            self.parsing('--jobs=x')
+        with ShouldRaise(ValueError(
+                "--jobs should be a positive number, not '0'")):
+            self.parsing('--jobs=0')
+        with ShouldRaise(ValueError(
+                "--sample-every should be a positive number, not '-2'")):
+            self.parsing('--sample-every=-2')
+
+    def test_malformed_pages(self):
+        compare(self.parsing('--pages=1-3,7')['pages'], '1-3,7')
+        with ShouldRaise(ValueError(
+                "The '3-a' in pages specification is malformed, it should "
+                "be page number or range of pages alike '1-10'")):
+            self.parsing('--pages=1,3-a')
+        with ShouldRaise(ValueError(
+                "The '5-2' in pages specification is malformed, the first "
+                "page of range should not be after the last one")):
+            self.parsing('--pages=5-2')
+
+    def test_workers_option(self):
+        def workers(*argv):
+            return workers_option(docopt(cli.__doc__,
+                                         argv=list(argv) + ['deck.pdf']))
+        compare(workers(), None)
+        compare(workers('--workers=3'), 3)
+        with ShouldRaise(ValueError(
+                "--workers should be a positive number, not 'abc'")):
+            workers('--workers=abc')
+        with ShouldRaise(ValueError(
+                "--workers should be a positive number, not '0'")):
+            workers('-w', '0')
+
+    def test_usage_error(self):
+        with Replacer() as replacer:
+            replacer.replace('sys.argv',
+                             ['slidelint', '--jobs=many', 'deck.pdf'])
+            try:
+                cli.cli()
+            except DocoptExit, error:
+                message = str(error)
+            else:
+                self.fail("DocoptExit wasn't raised")
+        self.assertTrue(message.startswith(
+            "--jobs should be a positive number, not 'many'\nUsage:"))
+        with Replacer() as replacer:
+            replacer.replace('sys.argv',
+                             ['slidelint', 'serve', '--workers=abc'])
+            with ShouldRaise(DocoptExit):
+                cli.cli()
+
+
+@help_wrapper(())
+def muting_checker(target_file=None, disabled_messages=()):
+    return [{'id': i, 'page': target_file} for i in disabled_messages]
+
+
+def plain_checker(target_file=None):
+    return []
+
+
+class TestDisabledMessages(unittest.TestCase):
+    def test_takes_argument(self):
+        compare(takes_argument(muting_checker, 'disabled_messages'), True)
+        compare(takes_argument(plain_checker, 'disabled_messages'), False)
+        compare(takes_argument(lambda **kwargs: [], 'disabled_messages'),
+                True)
+
+    def test_disabled_messages_passed_to_checkers(self):
+        _, config = compose_config(None, ('', 'C2005,W1001'),
+                                   "slidelint.tests")
+        checkers = [Checker('muting_checker', 'Test', muting_checker),
+                    Checker('plain_checker', 'Test', plain_checker)]
+        manager = checkers_manager('deck.pdf', checkers, config, {})
+        compare([kwargs for _, kwargs in manager.poll],
+                [{'target_file': 'deck.pdf',
+                  'disabled_messages': ['C2005', 'W1001']},
+                 {'target_file': 'deck.pdf'}])
+        # nothing is passed when there is no muted messages
+        _, config = compose_config(None, ('', ''), "slidelint.tests")
+        manager = checkers_manager('deck.pdf', checkers, config, {})
+        compare([kwargs for _, kwargs in manager.poll],
+                [{'target_file': 'deck.pdf'}, {'target_file': 'deck.pdf'}])
+
+
+class TestPrestart(unittest.TestCase):
+    def test_prestart_before_parsing(self):
+        calls = []
+
+        def checker(target_file=None, arg1=None, arg2=None,
+                    disabled_messages=()):
+            return []
+        checker.prestart = lambda **kwargs: calls.append(('prestart',
+                                                          kwargs))
+
+        class Pluggins(object):
+            def load_checkers(self, **kwargs):
+                return [Checker('test_cheker_1', 'Test', checker)]
+        _, config = compose_config(
+            os.path.join(here, 'test_models.cfg'), ('', 'C2005'),
+            "slidelint.tests")
+        with Replacer() as replacer:
+            replacer.replace(
+                'slidelint.cli.parse_document',
+                lambda *args: calls.append(('parse', args[0])))
+            lint(presentation, None,
+                 {'format': 'raw', 'files_output': False, 'ids': True},
+                 ('', ''), None, composer=lambda *args: (Pluggins(), config))
+        compare(calls, [('prestart', {'arg1': '10', 'arg2': '20',
+                                      'disabled_messages': ['C2005']}),
+                        ('parse', presentation)])
+        # config args aren't changed by checkers args
+        compare(config.get_checker_args('test_cheker_1'),
+                {'arg1': '10', 'arg2': '20'})
+
+
 if __name__ == '__main__':
     unittest.main()
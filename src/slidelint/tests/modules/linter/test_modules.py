@@ -1,3 +1,4 @@
+import time
 from collections import namedtuple
 
 messages_g1_c1 = (
@@ -23,6 +24,11 @@ def exeption_raising_func(arg):
     return [1/arg]
 
 
+def sleeping_func(delay, value):
+    time.sleep(delay)
+    return [value]
+
+
 def group1_cheker1(target_file=None, msg_info=None, arg1=None, arg2=None):
     messages = messages_g1_c1
     if msg_info:
@@ -58,3 +64,13 @@ def group2_cheker1(target_file=None, msg_info=None):
         return rez
     return [dict(id='C2011', msg_name='critical-C2011',
                  msg='warning message with id C2011', page='1')]
+
+
+def pages_text_cheker(target_file=None, pages_text=None):
+    return [dict(id='P0001', page=str(len(list(pages_text))))]
+
+
+def loaded_pages_cheker(target_file=None):
+    from slidelint.pdf_utils import load_document
+    return [dict(id='P0002',
+                 page=str(len(load_document(target_file).pages)))]
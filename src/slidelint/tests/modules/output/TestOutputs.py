@@ -1,7 +1,8 @@
 import os
 import unittest
 from testfixtures import OutputCapture, TempDirectory, compare
-from slidelint.outputs import output_handler
+from slidelint.outputs import output_handler, report_file_name, \
+    report_title
 
 
 class TestSequenceFunctions(unittest.TestCase):
@@ -91,3 +92,32 @@ class TestSequenceFunctions(unittest.TestCase):
                 "********************** Slide Deck presentation.pdf\n"
                 "W:2: message 1 (short-name-1)\n"
                 "C:4: message 4 (short-name-4)\n\n")
+
+    def test_report_file_name(self):
+        compare(report_file_name('a/presentation.pdf'),
+                'presentation.lintrez')
+        compare(report_file_name('/a/b/presentation.pdf', unique=True),
+                'a_b_presentation.lintrez')
+        with TempDirectory() as d:
+            os.chdir(d.path)
+            output_handler(self.path, self.rezults,
+                           report_file='other.lintrez')
+            compare(os.listdir(d.path), ['other.lintrez'])
+
+    def test_report_title(self):
+        compare(report_title('a/presentation.pdf'), 'presentation.pdf')
+        compare(report_title('a/presentation.pdf', unique=True),
+                'a/presentation.pdf')
+        compare(report_title(os.path.abspath('b/presentation.pdf'),
+                             unique=True),
+                'b/presentation.pdf')
+
+    def test_many_files_headers(self):
+        with OutputCapture() as output:
+            output_handler(self.path, self.rezults[:1])
+            output_handler('other.pdf', self.rezults[1:])
+        output.compare(
+            "********************** Slide Deck presentation.pdf\n"
+            "W:2: message 1 (short-name-1)\n\n"
+            "********************** Slide Deck other.pdf\n"
+            "C:4: message 4 (short-name-4)\n")
@@ -0,0 +1,228 @@
+import os.path
+import shutil
+import threading
+import unittest
+from testfixtures import compare, TempDirectory, Replacer, ShouldRaise
+
+from slidelint import pdf_utils
+from slidelint.cache import FileCache, SqliteCache
+
+here = os.path.dirname(os.path.abspath(__file__))
+checkers_tests = os.path.join(os.path.dirname(os.path.dirname(here)),
+                              'checkers')
+source_file = os.path.join(
+    checkers_tests, 'empty_presentation',
+    'libreoffice_presentation_with_content.pdf')
+empty_file = os.path.join(
+    checkers_tests, 'empty_presentation',
+    'libreoffice_empty_presentation.pdf')
+
+
+class TestDocumentModel(unittest.TestCase):
+
+    def test_document_parsed_once(self):
+        document = pdf_utils.load_document(source_file)
+        self.assertTrue(pdf_utils.load_document(source_file) is document)
+        compare(list(pdf_utils.document_pages_layouts(source_file)),
+                document.pages)
+
+    def test_changed_document_reloaded(self):
+        with TempDirectory() as temp_dir:
+            path = os.path.join(temp_dir.path, 'presentation.pdf')
+            shutil.copy(source_file, path)
+            document = pdf_utils.load_document(path)
+            self.assertTrue(any(
+                any(page) for page in pdf_utils.convert_pdf_to_text(path)))
+            shutil.copy(empty_file, path)
+            os.utime(path, (0, 0))
+            self.assertFalse(pdf_utils.load_document(path) is document)
+            self.assertFalse(any(
+                any(page) for page in pdf_utils.convert_pdf_to_text(path)))
+
+    def test_parsed_document_cached(self):
+        with TempDirectory() as temp_dir:
+            cache = FileCache('layouts')
+            cache.path = temp_dir.path
+            document = pdf_utils.DocumentModel(source_file, cache)
+            compare(len(os.listdir(temp_dir.path)), 1)
+            with Replacer() as replacer:
+                replacer.replace('slidelint.pdf_utils.parse_pdf', None)
+                cached = pdf_utils.DocumentModel(source_file, cache)
+            compare(cached.text, document.text)
+            compare(cached.pages, document.pages)
+
+
+class TestParallelParsing(unittest.TestCase):
+
+    def test_same_as_serial(self):
+        path = os.path.join(checkers_tests, 'font_size',
+                            'libreoffice_font_gradient.pdf')
+        compare(pdf_utils.count_pdf_pages(path), 16)
+        serial = pdf_utils.DocumentModel(path, cache=None)
+        parallel = pdf_utils.DocumentModel(path, cache=None, jobs=3)
+        compare(parallel.text, serial.text)
+        compare([(num, list(page.characters))
+                 for num, page in parallel.pages],
+                [(num, list(page.characters))
+                 for num, page in serial.pages])
+
+
+class TestPagesSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(checkers_tests, 'font_size',
+                                 'libreoffice_font_gradient.pdf')
+
+    def test_select_pages(self):
+        compare(pdf_utils.select_pages(self.path), None)
+        compare(pdf_utils.select_pages(self.path, '1-3,7,15-20'),
+                [0, 1, 2, 6, 14, 15])
+        compare(pdf_utils.select_pages(self.path, sample_every=5),
+                [0, 5, 10, 15])
+        compare(pdf_utils.select_pages(self.path, '2-8', 3), [1, 4, 7])
+        with ShouldRaise(ValueError):
+            pdf_utils.select_pages(self.path, '1-x')
+        with ShouldRaise(ValueError):
+            pdf_utils.select_pages(self.path, '5-2')
+
+    def test_pages_ranges(self):
+        compare(pdf_utils.pages_ranges([0, 1, 2, 6, 14, 15]),
+                [(0, 2), (6, 6), (14, 15)])
+        compare(pdf_utils.pages_ranges([]), [])
+
+    def test_selected_pages_keep_numbers(self):
+        full = pdf_utils.DocumentModel(self.path, cache=None)
+        for jobs in (1, 2):
+            document = pdf_utils.DocumentModel(
+                self.path, cache=None, jobs=jobs, pages='2,5-6')
+            compare([num for num, _ in document.pages], [1, 4, 5])
+            compare([list(page.characters) for _, page in document.pages],
+                    [list(full.pages[i][1].characters) for i in (1, 4, 5)])
+            full_text = [list(i) for i in full.pages_text()]
+            compare([list(i) for i in document.pages_text()][:6],
+                    [full_text[i] if i in (1, 4, 5) else []
+                     for i in range(6)])
+
+
+class TestStreamingText(unittest.TestCase):
+
+    def test_pages_parsed_lazily(self):
+        path = os.path.join(checkers_tests, 'font_size',
+                            'libreoffice_font_gradient.pdf')
+        parsed = []
+        original = pdf_utils.layout_text
+
+        def layout_text(layout):
+            parsed.append(layout)
+            return original(layout)
+        with Replacer() as replacer:
+            replacer.replace('slidelint.pdf_utils._LOADED', {})
+            replacer.replace('slidelint.pdf_utils.layout_text', layout_text)
+            pages = pdf_utils.iter_pages_text(path)
+            compare(next(pages), ['1/1'])
+            compare(len(parsed), 1)
+            full = pdf_utils.DocumentModel(path, cache=None)
+            compare([next(pages)] + list(pages),
+                    [list(i) for i in full.pages_text()][1:16])
+
+    def test_streamed_document_cached(self):
+        path = os.path.join(checkers_tests, 'font_size',
+                            'libreoffice_font_gradient.pdf')
+        full = [list(i) for i in
+                pdf_utils.DocumentModel(path, cache=None).pages_text()]
+        with TempDirectory() as temp_dir:
+            with Replacer() as replacer:
+                replacer.replace('slidelint.pdf_utils._LOADED', {})
+                replacer.replace('slidelint.pdf_utils.LAYOUTS_CACHE.path',
+                                 temp_dir.path)
+                pages = pdf_utils.stream_pages_text(path)
+                compare(next(pages), ['1/1'])
+                self.assertTrue(pdf_utils.loaded_document(path) is None)
+                compare([next(pages)] + list(pages), full[1:16])
+                # parsed document is loaded and cached as a whole
+                document = pdf_utils.loaded_document(path)
+                compare([list(i) for i in document.pages_text()], full)
+                compare(len(os.listdir(temp_dir.path)), 1)
+                replacer.replace('slidelint.pdf_utils._LOADED', {})
+                replacer.replace('slidelint.pdf_utils.parse_pdf_layouts',
+                                 None)
+                compare(list(pdf_utils.stream_pages_text(path)), full)
+
+    def test_pages_without_text_skipped(self):
+        path = os.path.join(checkers_tests, 'empty_presentation',
+                            'msoffice_empty_presentation.pdf')
+        compare([layout for _, layout in pdf_utils.parse_pdf_layouts(
+                 path, pdf_utils.LAParams(), prescan=True)],
+                [None])
+
+
+class TestCharactersTable(unittest.TestCase):
+
+    def test_columns_and_lines(self):
+        document = pdf_utils.DocumentModel(source_file, cache=None)
+        _, page = document.pages[0]
+        characters = page.characters
+        self.assertTrue(len(characters) > 0)
+        compare(list(characters),
+                sum(list(characters.lines()), []))
+        compare(min(characters.size), min(c.size for c in characters))
+        compare(max(characters.x1), max(c.bbox[2] for c in characters))
+        first = characters.row(0)
+        compare(first.bbox, (characters.x0[0], characters.y0[0],
+                             characters.x1[0], characters.y1[0]))
+        compare(first.fontname, characters.fonts[characters.font[0]])
+
+
+class TestFileCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        with TempDirectory() as temp_dir:
+            cache = FileCache('test', size_limit=450)
+            cache.path = temp_dir.path
+            for key in ('a', 'b', 'c'):
+                cache.set(key, os.urandom(100))
+                os.utime(os.path.join(temp_dir.path, key + '.bin'),
+                         (0, ord(key)))
+            self.assertTrue(cache.get('a') is not None)
+            cache.set('d', os.urandom(100))
+            compare(sorted(os.listdir(temp_dir.path)),
+                    ['a.bin', 'c.bin', 'd.bin'])
+            compare(cache.get('b'), None)
+
+
+class TestSqliteCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        clock = iter(range(100)).next
+        with TempDirectory() as temp_dir, Replacer() as r:
+            r.replace('slidelint.cache.time.time', clock)
+            cache = SqliteCache('test', size_limit=350)
+            cache.path = os.path.join(temp_dir.path, 'test.sqlite')
+            for key in ('a', 'b', 'c'):
+                cache.set_many([(key, os.urandom(100))])
+            compare(sorted(cache.get_many(['a', 'x'])), ['a'])
+            cache.set_many([('d', os.urandom(100))])
+            compare(sorted(cache.get_many(['a', 'b', 'c', 'd'])),
+                    ['a', 'c', 'd'])
+
+    def test_used_by_many_threads(self):
+        with TempDirectory() as temp_dir:
+            cache = SqliteCache('test')
+            cache.path = os.path.join(temp_dir.path, 'test.sqlite')
+            cache.set_many([('a', 1)])
+            values = []
+            thread = threading.Thread(
+                target=lambda: values.append(cache.get_many(['a'])))
+            thread.start()
+            thread.join()
+            compare(values, [{'a': 1}])
+
+    def test_broken_cache(self):
+        with TempDirectory() as temp_dir:
+            cache = SqliteCache('test')
+            cache.path = temp_dir.write('test.sqlite', 'not a database')
+            cache.set_many([('a', 1)])
+            compare(cache.get_many(['a']), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 """ Bunch of helping classes and functions """
-from multiprocessing import Process, Queue
+import inspect
+from functools import wraps
+from multiprocessing import Process, Queue, Pool
 
 import logging
 LOGGER = logging.getLogger(__name__)
@@ -30,6 +32,8 @@ def help_wrapper(messages):
     """ decorator for providing help messages (arguments allowing trick)"""
     def help_decorator(function):
         """ real decorator """
+        # keeping function name makes it picklable for workers pool
+        @wraps(function)
         def wrapped(**kargs):
             """ actual wrapper that returns help messages if msg_info are
             present into function args"""
@@ -37,53 +41,184 @@ def help_wrapper(messages):
             if msg_info:
                 return provide_help(messages, msg_info)
             return encoding_normalazer(function(**kargs))
+        # arguments of decorated function are checked by takes_argument
+        wrapped.original = function
         return wrapped
     return help_decorator
 
 
-def processes_wrapper(queue, funk, kwargs):
-    """ helper for getting results from different processes """
+def takes_argument(function, name):
+    """ checks whether function takes argument with the name, it allows
+    to pass optional arguments only to checkers that know about them """
+    function = getattr(function, 'original', function)
+    spec = inspect.getargspec(function)
+    return name in spec.args or spec.keywords is not None
+
+
+def call_function(funk, kwargs):
+    """ calls function, in case of exception its description is returned
+    instead of results """
     try:
-        rez = funk(**kwargs)
-        queue.put(rez)
+        return funk(**kwargs)
     # there is a need to catch all possible exceptions
     except Exception, msg:  # pylint: disable=W0703
         info = "The function '%s' of '%s' module "\
                "raised an Exception:\n" % (funk.__name__, funk.__module__)
-        queue.put(info + msg.message)
+        return info + msg.message
+
+
+def processes_wrapper(queue, funk, kwargs, tag=None):
+    """ helper for getting results from different processes, results are
+    tagged so many processes can share one queue """
+    queue.put((tag, call_function(funk, kwargs)))
+
+
+def pool_worker(args):
+    """ helper for running functions in workers pool, it takes
+    (funk, kwargs, tag, prepare) tuple, where prepare is None or
+    (function, kwargs) pair that is called in worker before funk, e.g. for
+    sharing parsed document with it """
+    funk, kwargs, tag, prepare = args
+    if prepare is not None:
+        prepare[0](**prepare[1])
+    return tag, call_function(funk, kwargs)
+
+
+def preload_modules(modules):
+    """ workers pool initializer - imports modules in advance, so workers
+    are ready to run checkers """
+    for name in modules:
+        try:
+            __import__(name)
+        # broken plugin will report its problem when it's called
+        except Exception:  # pylint: disable=W0703
+            LOGGER.debug("can't preload module '%s'", name)
+
+
+def create_workers_pool(size=None, modules=()):
+    """ creates pool of worker processes that can be reused for many
+    MultiprocessingManager runs; modules are imported by workers at start,
+    size is number of workers(cpu count by default) """
+    return Pool(size, preload_modules, (list(modules),))
+
+
+class Feed(object):
+    """ iterable of items that are put by the main process while function
+    it's passed to is already running in forked process(see
+    MultiprocessingManager.launch); closing feed with error makes
+    iteration raise it """
+    def __init__(self):
+        self.queue = Queue()
+        # consumer may stop reading at any item, so the main process
+        # mustn't wait for the rest of items to be read on exit
+        self.queue.cancel_join_thread()
+
+    def put(self, item):
+        """ passes item to the consumer """
+        self.queue.put((False, item))
+
+    def close(self, error=None):
+        """ marks the end of items """
+        self.queue.put((True, error))
+
+    def __iter__(self):
+        while True:
+            closed, item = self.queue.get()
+            if not closed:
+                yield item
+            elif item is not None:
+                raise item
+            else:
+                return
 
 
 class MultiprocessingManager(object):
-    """ class for handling multiprocessing run """
-    def __init__(self, debug=False):
+    """ class for handling multiprocessing run; results are yielded in order
+    of functions appending, or if ordered is False, as soon as each function
+    is done. By default each function is run in its own process, if pool is
+    given functions are run by its workers, and prepare (function, kwargs)
+    pair is called by worker before each function"""
+    def __init__(self, debug=False, ordered=True, pool=None, prepare=None):
         self.poll = []
         self.debug = debug
+        self.ordered = ordered
+        self.pool = pool
+        self.prepare = prepare
+        self.started = None
+        self.queue = None
+        self.processes = {}
 
     def append(self, func, kwargs):
         """ append function and its args to poll """
         self.poll.append((func, kwargs))
 
+    def start(self):
+        """ submits appended functions to workers pool without waiting for
+        results, so many managers can share pool workers at once """
+        tasks = [(func, kwargs, index, self.prepare)
+                 for index, (func, kwargs) in enumerate(self.poll)]
+        self.started = self.pool.imap_unordered(pool_worker, tasks)
+
+    def launch(self, indexes):
+        """ starts processes of appended functions with indexes in advance,
+        the others are started when results are asked for; it allows to run
+        functions that are fed by the main process(see Feed) while it
+        prepares data for the others """
+        if self.queue is None:
+            self.queue = Queue()
+        for index in indexes:
+            func, kwargs = self.poll[index]
+            process = self.processes[index] = Process(
+                target=processes_wrapper,
+                args=(self.queue, func, kwargs, index))
+            process.start()
+
+    def completed(self):
+        """ yields (index, result) of appended functions in order of
+        theirs completion, all functions results comes through one queue """
+        if self.pool is not None:
+            for rez in self.pool_completed():
+                yield rez
+            return
+        self.launch([index for index in xrange(len(self.poll))
+                     if index not in self.processes])
+        queue, processes = self.queue, self.processes
+        self.queue, self.processes = None, {}
+        for _ in processes:
+            index, checker_rez = queue.get()
+            if isinstance(checker_rez, basestring):
+                raise IOError(checker_rez)
+            yield index, checker_rez
+        for process in processes.values():
+            process.join()
+
+    def pool_completed(self):
+        """ yields (index, result) of appended functions in order of
+        theirs completion, functions are run by workers pool """
+        if self.started is None:
+            self.start()
+        started, self.started = self.started, None
+        for index, checker_rez in started:
+            if isinstance(checker_rez, basestring):
+                raise IOError(checker_rez)
+            yield index, checker_rez
+
     def __iter__(self):
         if self.debug:
             for func, kwargs in self.poll:
                 for rez in func(**kwargs):
                     yield rez
-        else:
-            queues = []
-            processes = []
-            for func, kwargs in self.poll:
-                queue = Queue()
-                processes.append(
-                    Process(target=processes_wrapper,
-                            args=(queue, func, kwargs)))
-                queues.append(queue)
-            for process in processes:
-                process.start()
-            for checker in queues:
-                checker_rez = checker.get()
-                if isinstance(checker_rez, basestring):
-                    raise IOError(checker_rez)
+        elif not self.ordered:
+            for _, checker_rez in self.completed():
                 for rez in checker_rez:
                     yield rez
-            for process in processes:
-                process.join()
+        else:
+            # results that came before results of previous functions
+            pending = {}
+            expected = 0
+            for index, checker_rez in self.completed():
+                pending[index] = checker_rez
+                while expected in pending:
+                    for rez in pending.pop(expected):
+                        yield rez
+                    expected += 1